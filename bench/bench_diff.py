@@ -0,0 +1,92 @@
+import os, sys, json, time, random, hashlib, argparse
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import discord_bot as bot
+
+def legacy_normalize_items(items: List[dict]) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for it in items:
+        n = str(it.get("name", "")).strip()
+        q = it.get("qty", 0)
+        try:
+            q = int(q)
+        except Exception:
+            q = 0
+        out[n] = q
+    return out
+
+def legacy_changed_item_names(prev: Dict[str, int], curr: Dict[str, int]) -> set:
+    names = set(prev.keys()) | set(curr.keys())
+    return {n for n in names if prev.get(n, None) != curr.get(n, None)}
+
+def legacy_batch_hash(items: List[dict]) -> str:
+    s = json.dumps([{"n": it.get("name"), "q": it.get("qty")} for it in items], sort_keys=False)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+def legacy_cosmetics_sig(items: List[dict]) -> str:
+    norm = [{"n": str(it.get("name", "")).strip().lower(), "q": it.get("qty")} for it in items]
+    norm.sort(key=lambda d: (d["n"], d["q"] if d["q"] is not None else -1))
+    return hashlib.sha256(json.dumps(norm, sort_keys=True).encode()).hexdigest()
+
+def make_frames(n: int, seed: int) -> List[Dict[str, List[dict]]]:
+    rnd = random.Random(seed)
+    cats = {
+        "seeds": [f"Seed {i}" for i in range(45)],
+        "gears": [f"Gear {i}" for i in range(20)],
+        "pets": [f"Egg {i}" for i in range(10)],
+        "cosmetics": [f"Cosmetic {i}" for i in range(12)],
+    }
+    state = {c: {name: rnd.randint(0, 5) for name in names} for c, names in cats.items()}
+    frames = []
+    for _ in range(n):
+        for c in ("seeds", "gears", "pets"):
+            for _ in range(rnd.choice((0, 0, 1, 2))):
+                state[c][rnd.choice(cats[c])] = rnd.randint(0, 5)
+        frames.append({c: [{"name": k, "qty": v, "ts": None} for k, v in m.items() if v] for c, m in state.items()})
+    return frames
+
+def run_legacy(frames) -> int:
+    last: Dict[str, Dict[str, int]] = {}
+    last_hash: Dict[str, str] = {}
+    hits = 0
+    for f in frames:
+        for c in ("seeds", "gears", "pets"):
+            curr = legacy_normalize_items(f[c])
+            legacy_changed_item_names(last.get(c, {}), curr)
+            last[c] = curr
+            h = legacy_batch_hash(f[c])
+            hits += last_hash.get(c) == h
+            last_hash[c] = h
+        legacy_cosmetics_sig(f["cosmetics"])
+    return hits
+
+def run_engine(frames) -> int:
+    last: Dict[str, bot._StockSnapshot] = {}
+    last_sig: Dict[str, tuple] = {}
+    hits = 0
+    for f in frames:
+        for c in ("seeds", "gears", "pets"):
+            curr = bot._StockSnapshot.from_items(f[c])
+            curr.diff(last.get(c, bot._EMPTY_SNAPSHOT))
+            last[c] = curr
+            h = bot._batch_signature(f[c])
+            hits += last_sig.get(c) == h
+            last_sig[c] = h
+        bot._signature_for_cosmetics(f["cosmetics"])
+    return hits
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-frame CPU cost of stock diffing and dedupe signatures")
+    ap.add_argument("--frames", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    frames = make_frames(args.frames, args.seed)
+    for label, fn in (("legacy json+sha256", run_legacy), ("diff engine", run_engine)):
+        t0 = time.perf_counter()
+        hits = fn(frames)
+        dt = time.perf_counter() - t0
+        print(f"{label:<20} {dt * 1e6 / len(frames):8.1f} us/frame  {len(frames) / dt:10.0f} frames/s  dedupe hits={hits}")
+
+if __name__ == "__main__":
+    main()
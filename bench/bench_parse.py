@@ -0,0 +1,47 @@
+import os, sys, time, argparse
+from typing import List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+import discord_bot as bot
+from frames import FrameGenerator
+
+def stock_lists(frames: List[dict]) -> List[list]:
+    return [v for f in frames for k, v in f.items() if k.endswith("_stock") and isinstance(v, list) and v]
+
+def short_lists(lists: List[list]) -> List[list]:
+    return [[{"name": it["display_name"], "qty": it["quantity"], "ts": it["start_date_unix"]} for it in items] for items in lists]
+
+def run_generic(lists: List[list]) -> int:
+    n = 0
+    for items in lists:
+        n += len([bot._extract_item_generic(it) for it in items])
+    return n
+
+def run_layout(lists: List[list]) -> int:
+    n = 0
+    for items in lists:
+        out: List[dict] = []
+        bot._extract_items(items, out)
+        n += len(out)
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-list CPU cost of stock item extraction")
+    ap.add_argument("--frames", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    full = stock_lists(FrameGenerator(args.seed).take(args.frames))
+    for layout, lists in (("upstream", full), ("name/qty/ts", short_lists(full))):
+        for label, fn in (("generic .get chain", run_generic), ("layout fast path", run_layout)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                items = fn(lists)
+                best = min(best, time.perf_counter() - t0)
+            print(f"{layout:<12} {label:<20} {best * 1e6 / len(lists):8.2f} us/list  {best * 1e9 / items:8.1f} ns/item")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os, sys, time, random, argparse
+from types import SimpleNamespace
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import discord_bot as bot
+
+def legacy_render_batch(category: str, items: List[dict], guild) -> Tuple[str, list]:
+    roles_to_ping = []
+    header = f"**{category.capitalize()} stock ({len(items)} item{'s' if len(items)!=1 else ''})**"
+    lines = [header]
+    remaining_chars = 2000 - len(header) - 1
+    for it in items:
+        name = str(it.get("name", "(unknown)"))
+        qty = it.get("qty")
+        label = name
+        if bot.ROLE_MENTIONS and guild and category in ("seeds", "pets", "gears"):
+            r = bot._find_role(guild, name, category)
+            if r:
+                label = r.mention
+                roles_to_ping.append(r)
+        line = f"• {label} — **{qty}**"
+        if len(line) + 1 <= remaining_chars:
+            lines.append(line)
+            remaining_chars -= (len(line) + 1)
+        else:
+            lines.append(f"… +{len(items) - (len(lines)-1)} more")
+            break
+    return "\n".join(lines), roles_to_ping
+
+def make_guilds(n: int, names: List[str]) -> list:
+    guilds = []
+    for g in range(n):
+        roles = [SimpleNamespace(id=g * 1000 + i, name=name, mention=f"<@&{g * 1000 + i}>") for i, name in enumerate(names) if i % 2 == 0]
+        guilds.append(SimpleNamespace(id=g + 1, roles=roles))
+    return guilds
+
+def make_frames(n: int, names: List[str], seed: int) -> List[List[dict]]:
+    rnd = random.Random(seed)
+    state = {name: rnd.randint(1, 5) for name in names}
+    frames = []
+    for _ in range(n):
+        state[rnd.choice(names)] = rnd.randint(1, 5)
+        frames.append([{"name": k, "qty": v} for k, v in state.items()])
+    return frames
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-frame cost of rendering a stock post for every guild")
+    ap.add_argument("--frames", type=int, default=2000)
+    ap.add_argument("--guilds", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    names = [n.title() for n in bot.CUSTOM_ORDER.get("seeds", {})] or [f"Seed {i}" for i in range(45)]
+    guilds = make_guilds(args.guilds, names)
+    frames = make_frames(args.frames, names, args.seed)
+    for g in guilds:
+        assert legacy_render_batch("seeds", frames[0], g)[0] == bot._render_batch("seeds", frames[0], None, g)[0]
+    for label, fn in (("legacy f-strings", lambda it, g: legacy_render_batch("seeds", it, g)),
+                      ("render cache", lambda it, g: bot._render_batch("seeds", it, None, g))):
+        t0 = time.perf_counter()
+        for items in frames:
+            for g in guilds:
+                fn(items, g)
+        dt = time.perf_counter() - t0
+        print(f"{label:<18} {dt * 1e6 / len(frames):8.1f} us/frame  ({args.guilds} guilds, {len(names)} items)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import asyncio, re, time
+from typing import Callable, Dict, List, Optional
+
+class FakeRole:
+    def __init__(self, rid: int, name: str):
+        self.id = rid
+        self.name = name
+        self.mention = f"<@&{rid}>"
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+class FakeGuild:
+    def __init__(self, gid: int, role_names: List[str] = ()):
+        self.id = gid
+        self.roles = [FakeRole(gid * 1000 + i, n) for i, n in enumerate(role_names)]
+
+class FakeMessage:
+    def __init__(self, mid: int, channel: "FakeChannel", content: Optional[str]):
+        self.id = mid
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, **kwargs):
+        await self.channel.sink._latency()
+        self.content = kwargs.get("content", self.content)
+        self.channel.sink.record(self.channel, kwargs, edit=True)
+        return self
+
+    async def pin(self, **kwargs):
+        await self.channel.sink._latency()
+        self.channel.sink.pins += 1
+
+class FakeChannel:
+    def __init__(self, cid: int, guild: FakeGuild, sink: "FakeSink"):
+        self.id = cid
+        self.guild = guild
+        self.sink = sink
+
+    async def send(self, **kwargs):
+        await self.sink._latency()
+        self.sink.record(self, kwargs)
+        return FakeMessage(self.sink.sent, self, kwargs.get("content"))
+
+    async def fetch_message(self, mid: int):
+        return FakeMessage(mid, self, None)
+
+    def get_partial_message(self, mid: int):
+        return FakeMessage(mid, self, None)
+
+_MARKER_RE = re.compile(r"Bench Marker\S* — \*\*(\d+)\*\*")
+
+class FakeSink:
+    def __init__(self, api_latency: float = 0.0, on_marker: Optional[Callable[[int, float], None]] = None):
+        self.api_latency = api_latency
+        self.on_marker = on_marker
+        self.channels: Dict[int, FakeChannel] = {}
+        self.sent = 0
+        self.edits = 0
+        self.pins = 0
+        self.by_channel: Dict[int, int] = {}
+
+    async def _latency(self):
+        if self.api_latency > 0:
+            await asyncio.sleep(self.api_latency)
+
+    def add_channels(self, ids: List[int], guilds: int = 1, role_names: List[str] = ()) -> List[FakeChannel]:
+        gs = [FakeGuild(900_000 + i, role_names) for i in range(max(1, guilds))]
+        out = []
+        for i, cid in enumerate(ids):
+            ch = self.channels[cid] = FakeChannel(cid, gs[i % len(gs)], self)
+            out.append(ch)
+        return out
+
+    def get_channel(self, cid: int):
+        return self.channels.get(cid)
+
+    def record(self, ch: FakeChannel, kwargs: dict, edit: bool = False):
+        if edit:
+            self.edits += 1
+        else:
+            self.sent += 1
+        self.by_channel[ch.id] = self.by_channel.get(ch.id, 0) + 1
+        if self.on_marker:
+            m = _MARKER_RE.search(kwargs.get("content") or "")
+            if m:
+                self.on_marker(int(m.group(1)), time.perf_counter())
@@ -0,0 +1,103 @@
+import os, json, time, random
+from typing import Dict, Iterator, List, Optional
+
+ORDER_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "order_config.json")
+MARKER_ITEM = "Bench Marker"
+WEATHERS = ["Rain", "Thunderstorm", "Frost", "Windy", "SheckleRain", "JandelStorm", "BloodMoonEvent", "MeteorShower", "Tornado"]
+MERCHANTS = ["Gnome Merchant", "Honey Merchant", "Summer Merchant", "Sky Merchant"]
+COSMETICS = ["Red Tractor", "Green Tractor", "Bird Bath", "Lamp Post", "Wood Pile", "Brown Bench", "Hay Bale", "Sign Crate"]
+
+def _load_names() -> Dict[str, List[str]]:
+    try:
+        with open(ORDER_CONFIG, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    return {
+        "seed": data.get("seeds") or [f"Seed {i}" for i in range(40)],
+        "gear": data.get("gears") or [f"Gear {i}" for i in range(18)],
+        "egg": data.get("pets") or [f"Egg {i}" for i in range(10)],
+    }
+
+def _item(name: str, qty: int, start: int) -> dict:
+    item_id = name.lower().replace(" ", "_")
+    return {"item_id": item_id, "display_name": name, "quantity": qty, "start_date_unix": start,
+            "end_date_unix": start + 300, "Date_Start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start)),
+            "icon": f"https://example.invalid/icons/{item_id}.png"}
+
+class FrameGenerator:
+    def __init__(self, seed: int = 1, restock_every: int = 10, weather_every: int = 7, merchant_every: int = 50):
+        self.rnd = random.Random(seed)
+        self.names = _load_names()
+        self.restock_every = max(1, restock_every)
+        self.weather_every = max(1, weather_every)
+        self.merchant_every = max(1, merchant_every)
+        self.seq = 0
+        self.stock: Dict[str, Dict[str, int]] = {}
+        self._restock(int(time.time()))
+
+    def _restock(self, now: int):
+        for cat, names in self.names.items():
+            k = max(1, len(names) // 3)
+            self.stock[cat] = {n: self.rnd.randint(1, 8) for n in self.rnd.sample(names, k)}
+        self.stock["cosmetic"] = {n: 1 for n in self.rnd.sample(COSMETICS, 4)}
+        self.restocked_at = now
+
+    def next(self) -> dict:
+        self.seq += 1
+        now = int(time.time())
+        if self.seq % self.restock_every == 0:
+            self._restock(now)
+        else:
+            cat = self.rnd.choice(("seed", "gear", "egg"))
+            if self.stock[cat]:
+                name = self.rnd.choice(list(self.stock[cat]))
+                self.stock[cat][name] = max(0, self.stock[cat][name] - self.rnd.randint(1, 2))
+        frame: dict = {}
+        for cat in ("seed", "gear", "egg", "cosmetic"):
+            items = [_item(n, q, self.restocked_at) for n, q in self.stock[cat].items() if q > 0]
+            if cat == "seed":
+                items.append(_item(MARKER_ITEM, self.seq, self.restocked_at))
+            frame[f"{cat}_stock"] = items
+        if self.seq % self.weather_every == 0:
+            w = self.rnd.choice(WEATHERS)
+            frame["weather"] = [{"weather_id": w, "weather_name": w, "active": True, "duration": 120,
+                                 "start_duration_unix": now, "end_duration_unix": now + 120 + self.seq,
+                                 "icon": f"https://example.invalid/weather/{w}.png"}]
+        if self.seq % self.merchant_every == 0:
+            frame["travelingmerchant_stock"] = {
+                "merchantName": self.rnd.choice(MERCHANTS),
+                "stock": [_item(f"Merchant Item {i}", self.rnd.randint(1, 3), now) for i in range(self.rnd.randint(2, 5))],
+            }
+        return frame
+
+    def take(self, n: int) -> List[dict]:
+        return [self.next() for _ in range(n)]
+
+def marker_seq(frame: dict) -> Optional[int]:
+    for it in frame.get("seed_stock") or []:
+        if it.get("display_name") == MARKER_ITEM:
+            return int(it.get("quantity") or 0)
+    return None
+
+def save_frames(path: str, frames: List[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for fr in frames:
+            f.write(json.dumps(fr, separators=(",", ":")) + "\n")
+
+def load_frames(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Generate synthetic WS frames as JSON lines")
+    ap.add_argument("out")
+    ap.add_argument("--frames", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    save_frames(args.out, FrameGenerator(args.seed).take(args.frames))
+    print(f"wrote {args.frames} frames to {args.out}")
@@ -0,0 +1,75 @@
+import asyncio, json, time
+from typing import Callable, List, Optional
+from aiohttp import web, WSMsgType
+
+class ReplayServer:
+    def __init__(self, frames: List[dict], rate: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 on_sent: Optional[Callable[[int, dict, float], None]] = None, loop_frames: bool = False):
+        self.frames = frames
+        self.rate = rate
+        self.host = host
+        self.port = port
+        self.on_sent = on_sent
+        self.loop_frames = loop_frames
+        self.sent = 0
+        self.done = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def _ws(self, request: web.Request):
+        ws = web.WebSocketResponse(heartbeat=20)
+        await ws.prepare(request)
+        gap = 1.0 / self.rate if self.rate > 0 else 0.0
+        try:
+            while True:
+                for i, frame in enumerate(self.frames):
+                    if ws.closed:
+                        return ws
+                    await ws.send_str(json.dumps(frame, separators=(",", ":")))
+                    self.sent += 1
+                    if self.on_sent:
+                        self.on_sent(i, frame, time.perf_counter())
+                    await asyncio.sleep(gap)
+                if not self.loop_frames:
+                    break
+            self.done.set()
+            async for msg in ws:
+                if msg.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                    break
+        finally:
+            self.done.set()
+        return ws
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws", self._ws)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+async def _serve(path: str, rate: float, port: int, loop_frames: bool):
+    from frames import load_frames
+    srv = ReplayServer(list(load_frames(path)), rate=rate, port=port, loop_frames=loop_frames)
+    await srv.start()
+    print(f"replaying {len(srv.frames)} frames on {srv.url}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Serve recorded frames over a local WebSocket")
+    ap.add_argument("frames", help="JSON-lines file (see frames.py)")
+    ap.add_argument("--rate", type=float, default=1.0, help="frames per second; 0 = as fast as possible")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--loop", action="store_true")
+    args = ap.parse_args()
+    asyncio.run(_serve(args.frames, args.rate, args.port, args.loop))
@@ -0,0 +1,138 @@
+import os, sys, json, time, asyncio, argparse, resource
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+async def run(args) -> Dict[str, float]:
+    import discord_bot as db
+    from frames import FrameGenerator, load_frames, marker_seq
+    from fake_discord import FakeSink
+    from replay_server import ReplayServer
+
+    frames = list(load_frames(args.replay)) if args.replay else FrameGenerator(args.seed).take(args.frames)
+    sent_at: Dict[int, float] = {}
+    latencies: List[float] = []
+
+    def on_sent(_i: int, frame: dict, t: float):
+        seq = marker_seq(frame)
+        if seq is not None:
+            sent_at[seq] = t
+
+    def on_marker(seq: int, t: float):
+        t0 = sent_at.pop(seq, None)
+        if t0 is not None:
+            latencies.append(t - t0)
+
+    sink = FakeSink(api_latency=args.api_latency, on_marker=on_marker)
+    ids = [100 + i for i in range(args.channels)]
+    sink.add_channels(ids, guilds=args.guilds)
+    for cat in db.CATEGORY_FANOUT:
+        db.CATEGORY_FANOUT[cat] = ids
+        db.CATEGORY_CHANNELS[cat] = ids[0]
+    db.bot.get_channel = sink.get_channel
+
+    server = ReplayServer(frames, rate=args.rate, on_sent=on_sent)
+    await server.start()
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    consumer = asyncio.create_task(db.ws_consumer(server.url))
+    deadline = t0 + args.timeout
+    while (db._WS_STATS["frames"] < len(frames) or not db._FRAME_BUF.drained()) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+    t_proc = time.perf_counter() - t0
+    while any(lane.task for lane in db._LANES.values()) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+    t_total = time.perf_counter() - t0
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    await server.stop()
+    processed = db._WS_STATS["frames"]
+    return {
+        "frames": len(frames),
+        "processed": processed,
+        "frames_per_sec": processed / t_proc if t_proc > 0 else 0.0,
+        "p50_ms": _pct(latencies, 50) * 1000,
+        "p99_ms": _pct(latencies, 99) * 1000,
+        "batches": db._WS_STATS["processed"],
+        "superseded": db._FRAME_BUF.stats["superseded"],
+        "messages": sink.sent,
+        "edits": sink.edits,
+        "drain_sec": t_total,
+        "rss_mb": _rss_mb(),
+        "rss_delta_mb": _rss_mb() - rss0,
+    }
+
+def _compare(result: Dict[str, float], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    problems = []
+    if base.get("frames_per_sec") and result["frames_per_sec"] < base["frames_per_sec"] * (1 - tolerance):
+        problems.append(f"frames/sec {result['frames_per_sec']:.0f} < baseline {base['frames_per_sec']:.0f}")
+    for key in ("p50_ms", "p99_ms", "rss_mb"):
+        if base.get(key) and result[key] > base[key] * (1 + tolerance):
+            problems.append(f"{key} {result[key]:.1f} > baseline {base[key]:.1f}")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay frames through ws_consumer into fake Discord channels")
+    ap.add_argument("--frames", type=int, default=2000)
+    ap.add_argument("--replay", help="JSON-lines file of recorded frames instead of generated ones")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--rate", type=float, default=0.0, help="frames per second; 0 = as fast as possible")
+    ap.add_argument("--channels", type=int, default=1, help="subscribed channels per category")
+    ap.add_argument("--guilds", type=int, default=1)
+    ap.add_argument("--api-latency", type=float, default=0.0, help="simulated Discord API latency (seconds)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--json", action="store_true", help="print the result as JSON")
+    ap.add_argument("--save", help="write the result to this JSON file (use as a baseline)")
+    ap.add_argument("--compare", help="baseline JSON file; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    os.environ.setdefault("SEND_RPS", "10000")
+    os.environ.setdefault("SEND_BURST", "10000")
+    os.environ.setdefault("SEND_GLOBAL_RPS", "100000")
+    os.environ.setdefault("SINGLE_ITEM_DEBOUNCE_SEC", "0")
+    os.environ.setdefault("ROLE_MENTIONS", "0")
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"frames processed : {result['processed']}/{result['frames']}")
+        print(f"frames/sec       : {result['frames_per_sec']:.0f}")
+        print(f"frame->send p50  : {result['p50_ms']:.2f} ms")
+        print(f"frame->send p99  : {result['p99_ms']:.2f} ms")
+        print(f"dispatch batches : {result['batches']} ({result['superseded']} superseded)")
+        print(f"messages emitted : {result['messages']} (+{result['edits']} edits)")
+        print(f"drain time       : {result['drain_sec']:.2f} s")
+        print(f"rss              : {result['rss_mb']:.1f} MB (+{result['rss_delta_mb']:.1f})")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        problems = _compare(result, args.compare, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION: {p}")
+        if problems:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
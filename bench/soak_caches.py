@@ -0,0 +1,67 @@
+import os, sys, time, asyncio, argparse
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+os.environ.setdefault("STATE_DB_PATH", "")
+os.environ.setdefault("HISTORY_DB_PATH", "")
+
+from run_pipeline import _rss_mb
+
+class _Role(SimpleNamespace):
+    def __hash__(self):
+        return self.id
+
+def feed(db, i: int):
+    guild = SimpleNamespace(id=i, roles=[_Role(id=i * 10 + k, name=f"Role {i}-{k}", mention=f"<@&{i * 10 + k}>") for k in range(3)])
+    db._find_role(guild, f"Item {i}", "seeds")
+    db._SNAPSHOT.apply({"weather": [{"weather_name": f"Event {i}", "weather_id": f"event_{i}", "active": True}]})
+    db._SNAPSHOT.view()
+    db.parse_stock_payload({"seed_stock": [{"name": f"Item {i}", "quantity": 1, f"k{i % 300}": 0}], f"x{i % 5000}_stock": []})
+    db._last_item_hash[("seeds", f"Item {i}")] = (("stock", i),)
+    db._suppress_weather(f"event_{i}", int(time.time()) + 3600)
+
+async def run(args) -> int:
+    import discord_bot as db
+    db._sweep_caches()
+    t0 = time.monotonic()
+    deadline = t0 + args.duration
+    baseline = None
+    i = 0
+    next_sample = t0
+    peak = 0.0
+    while time.monotonic() < deadline:
+        for _ in range(args.batch):
+            feed(db, i)
+            i += 1
+        await asyncio.sleep(0)
+        now = time.monotonic()
+        if now >= next_sample:
+            next_sample = now + args.sample
+            rss = _rss_mb()
+            if baseline is None and now - t0 >= args.duration * args.warmup:
+                baseline = rss
+            peak = max(peak, rss) if baseline is not None else peak
+            sizes = " ".join(f"{c.name}={len(c)}" for c in db._CACHES)
+            print(f"[soak] t={now - t0:7.0f}s keys={i:>10} rss={rss:7.1f}MB timers={len(db._TIMERS)} {sizes}", flush=True)
+    rss = _rss_mb()
+    if baseline is None:
+        baseline = rss
+    growth = max(peak, rss) - baseline
+    evicted = sum(n for c in db._CACHES for n in c.evicted.values())
+    print(f"[soak] {i} unique keys, {evicted} evictions, rss growth after warmup {growth:.1f}MB (limit {args.max_growth_mb}MB)")
+    return 0 if growth <= args.max_growth_mb else 1
+
+def main():
+    ap = argparse.ArgumentParser(description="Feed unique keys through the bot's module caches and check RSS stays flat")
+    ap.add_argument("--duration", type=float, default=3 * 3600, help="seconds to run")
+    ap.add_argument("--batch", type=int, default=500, help="unique keys per loop iteration")
+    ap.add_argument("--sample", type=float, default=30.0, help="seconds between RSS samples")
+    ap.add_argument("--warmup", type=float, default=0.2, help="fraction of the run before the RSS baseline is taken")
+    ap.add_argument("--max-growth-mb", type=float, default=16.0)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
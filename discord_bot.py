@@ -1,35 +1,128 @@
-import os, json, asyncio, hashlib, signal, sys, io, time, re
+import os, json, asyncio, signal, sys, io, time, re, socket, sqlite3, threading, gzip, hashlib, heapq, zlib, bisect, queue, random, atexit
+from array import array
+from itertools import accumulate
+from operator import itemgetter
+from collections import deque, OrderedDict
 from typing import Dict, Tuple, Optional, List, Any
 import discord
 from discord import Embed, Intents, AllowedMentions, app_commands
-from aiohttp import ClientSession, ClientConnectorError, WSMsgType, web
+from aiohttp import ClientSession, ClientConnectorError, ClientTimeout, WSMsgType, web
 from aiohttp.client_exceptions import WSServerHandshakeError
 from dotenv import load_dotenv
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 load_dotenv()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").strip().lower()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_REPEAT_WINDOW_SEC = float(os.getenv("LOG_REPEAT_WINDOW_SEC", "60"))
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "0.01"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+class _Logger:
+    def __init__(self):
+        self.default = _LEVELS.get(LOG_LEVEL, 20)
+        self.levels = {c.strip(): _LEVELS.get(lv.strip().lower(), 20)
+                       for c, _, lv in (p.partition("=") for p in LOG_LEVELS.split(",")) if c.strip()}
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue(max(1, LOG_QUEUE_MAX))
+        self.repeats: Dict[tuple, list] = {}
+        self.stats: Dict[str, int] = {"written": 0, "dropped": 0, "suppressed": 0, "sampled_out": 0}
+        self.thread: Optional[threading.Thread] = None
+
+    def enabled(self, component: str, level: str) -> bool:
+        return _LEVELS[level] >= self.levels.get(component, self.default)
+
+    def log(self, component: str, msg: str, level: str = "info", key: Optional[str] = None, sample: float = 0.0, **fields):
+        if _LEVELS[level] < self.levels.get(component, self.default):
+            return
+        if sample and random.random() >= sample:
+            self.stats["sampled_out"] += 1
+            return
+        now = time.time()
+        if key is not None or _LEVELS[level] >= 30:
+            rk = (component, key if key is not None else msg)
+            r = self.repeats.get(rk)
+            if r is not None and now - r[0] < LOG_REPEAT_WINDOW_SEC:
+                r[1] += 1
+                self.stats["suppressed"] += 1
+                return
+            if r is not None and r[1]:
+                fields["suppressed"] = r[1]
+            self.repeats[rk] = [now, 0]
+            if len(self.repeats) > 4096:
+                cutoff = now - LOG_REPEAT_WINDOW_SEC
+                self.repeats = {k: v for k, v in self.repeats.items() if v[0] >= cutoff}
+        if LOG_FORMAT == "text":
+            line = f"[{component}] {msg}" + "".join(f" {k}={v}" for k, v in fields.items())
+        else:
+            line = json.dumps({"ts": round(now, 3), "level": level, "component": component, "msg": msg, **fields},
+                              default=str, ensure_ascii=False)
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        out = sys.stdout
+        while True:
+            line = self.queue.get()
+            batch = []
+            while line is not None:
+                batch.append(line)
+                if len(batch) >= 256:
+                    break
+                try:
+                    line = self.queue.get_nowait()
+                except queue.Empty:
+                    line = ""
+                    break
+            if batch:
+                try:
+                    out.write("\n".join(batch) + "\n")
+                    out.flush()
+                except Exception:
+                    pass
+                self.stats["written"] += len(batch)
+            if line is None:
+                return
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=2)
+
+_LOG = _Logger()
+_log = _LOG.log
+atexit.register(_LOG.close)
 DISCORD_TOKEN   = os.getenv("DISCORD_TOKEN")
 EXTERNAL_WS_URL = os.getenv("EXTERNAL_WS_URL")
+EXTERNAL_HTTP_URLS = os.getenv("EXTERNAL_HTTP_URLS", "")
+HTTP_POLL_SEC = float(os.getenv("HTTP_POLL_SEC", "5"))
+UPSTREAM_DEDUPE_WINDOW_SEC = float(os.getenv("UPSTREAM_DEDUPE_WINDOW_SEC", "60"))
 WS_HEADERS_JSON   = os.getenv("WS_HEADERS_JSON", "")
 WS_SUBSCRIBE_JSON = os.getenv("WS_SUBSCRIBE_JSON", "")
 PING_EVERY = int(os.getenv("WS_PING_INTERVAL", "20"))
+WS_BACKOFF_BASE_SEC = float(os.getenv("WS_BACKOFF_BASE_SEC", "1"))
+WS_BACKOFF_MAX_SEC = float(os.getenv("WS_BACKOFF_MAX_SEC", "60"))
+WS_FAST_RECONNECT_SEC = float(os.getenv("WS_FAST_RECONNECT_SEC", "0.25"))
+WS_RESTOCK_CADENCE_SEC = float(os.getenv("WS_RESTOCK_CADENCE_SEC", "300"))
+WS_STALL_FACTOR = float(os.getenv("WS_STALL_FACTOR", "3"))
+WS_STALL_MIN_SEC = float(os.getenv("WS_STALL_MIN_SEC", "60"))
 DEBUG_RAW = os.getenv("DEBUG_RAW", "0") == "1"
 DEBUG_CHANNEL_ID = int(os.getenv("DEBUG_CHANNEL_ID", "0"))
 _DEBUG_SENT_ONCE = False
 DEBUG_CAPTURE_PAYLOAD = os.getenv("DEBUG_CAPTURE_PAYLOAD", "0") == "1"
 _last_raw_payload: Optional[dict] = None
 _last_effective_payload: Optional[dict] = None
-_state_snapshot: dict = {
-    "seed_stock": [],
-    "gear_stock": [],
-    "egg_stock": [],
-    "cosmetic_stock": [],
-    "eventshop_stock": [],
-    "weather": [],
-    "travelingmerchant_stock": None,
-    "notification": [],
-    "_meta": {"updated_at": 0}
-}
-_weather_index: Dict[str, dict] = {}
 
 def _weather_key(w: dict) -> Optional[str]:
     if not isinstance(w, dict):
@@ -37,45 +130,732 @@ def _weather_key(w: dict) -> Optional[str]:
     k = (w.get("weather_name") or w.get("weather_id") or "").strip()
     return k or None
 
-_SEND_Q: asyncio.Queue = asyncio.Queue()
+class _BoundedDict:
+    _MISSING = object()
+
+    def __init__(self, name: str, maxlen: int, ttl: float = 0.0, on_evict=None):
+        self.name = name
+        self.on_evict = on_evict
+        self.maxlen = max(1, int(os.getenv(f"CACHE_{name.upper()}_MAX", str(maxlen))))
+        self.ttl = float(os.getenv(f"CACHE_{name.upper()}_TTL_SEC", str(ttl)))
+        self.data: "OrderedDict[Any, list]" = OrderedDict()
+        self.evicted: Dict[str, int] = {"lru": 0, "ttl": 0}
+        _CACHES.append(self)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(list(self.data))
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def __getitem__(self, key):
+        v = self.get(key, self._MISSING)
+        if v is self._MISSING:
+            raise KeyError(key)
+        return v
+
+    def __setitem__(self, key, value):
+        self.data[key] = [value, time.monotonic()]
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxlen:
+            old, _ = self.data.popitem(last=False)
+            self.evicted["lru"] += 1
+            if self.on_evict is not None:
+                self.on_evict(old)
+
+    def get(self, key, default=None):
+        entry = self.data.get(key)
+        if entry is None:
+            return default
+        now = time.monotonic()
+        if self.ttl and now - entry[1] > self.ttl:
+            del self.data[key]
+            self.evicted["ttl"] += 1
+            if self.on_evict is not None:
+                self.on_evict(key)
+            return default
+        entry[1] = now
+        self.data.move_to_end(key)
+        return entry[0]
+
+    def peek(self, key, default=None):
+        entry = self.data.get(key)
+        return default if entry is None else entry[0]
+
+    def pop(self, key, default=None):
+        entry = self.data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def keys(self):
+        return list(self.data)
+
+    def values(self):
+        return [v for v, _ in self.data.values()]
+
+    def items(self):
+        return [(k, v) for k, (v, _) in self.data.items()]
+
+    def update(self, other: dict):
+        for k, v in other.items():
+            self[k] = v
+
+    def clear(self):
+        self.data.clear()
+
+    def sweep(self) -> int:
+        if not self.ttl:
+            return 0
+        cutoff = time.monotonic() - self.ttl
+        n = 0
+        while self.data:
+            key, entry = next(iter(self.data.items()))
+            if entry[1] > cutoff:
+                break
+            del self.data[key]
+            n += 1
+            if self.on_evict is not None:
+                self.on_evict(key)
+        self.evicted["ttl"] += n
+        return n
+
+_CACHES: List[_BoundedDict] = []
+CACHE_SWEEP_SEC = float(os.getenv("CACHE_SWEEP_SEC", "60"))
+
+class _SnapshotStore:
+    def __init__(self):
+        self.stocks: Dict[str, list] = {k: [] for k in ("seed_stock", "gear_stock", "egg_stock", "cosmetic_stock", "eventshop_stock")}
+        self.weather = _BoundedDict("snapshot_weather", 256, 7 * 86400)
+        self.merchant: Optional[dict] = None
+        self.notification: list = []
+        self.updated_at = 0
+        self.version = 0
+        self._view: Optional[dict] = None
+
+    def apply(self, raw: dict, updated_at: Optional[int] = None) -> bool:
+        touched = False
+        for k, v in raw.items():
+            if isinstance(k, str) and k.endswith("_stock") and isinstance(v, list):
+                self.stocks[k] = v
+                touched = True
+        weather = raw.get("weather")
+        if isinstance(weather, list):
+            for w in weather:
+                key = _weather_key(w)
+                if key:
+                    self.weather[key] = w
+            touched = True
+        if isinstance(raw.get("notification"), list):
+            self.notification = raw["notification"]
+            touched = True
+        if isinstance(raw.get("travelingmerchant_stock"), dict):
+            self.merchant = raw["travelingmerchant_stock"]
+            touched = True
+        if touched:
+            self.updated_at = int(time.time()) if updated_at is None else int(updated_at)
+            self.version += 1
+            self._view = None
+        return touched
+
+    def view(self) -> dict:
+        v = self._view
+        if v is None:
+            v = dict(self.stocks)
+            v["weather"] = list(self.weather.values())
+            v["travelingmerchant_stock"] = self.merchant
+            v["notification"] = self.notification
+            v["_meta"] = {"updated_at": self.updated_at, "version": self.version}
+            self._view = v
+        return v
+
+_SNAPSHOT = _SnapshotStore()
+
+PAYLOAD_FORMATS = ("pretty", "compact", "gzip")
+PAYLOAD_GZIP_LEVEL = int(os.getenv("PAYLOAD_GZIP_LEVEL", "6"))
+_PAYLOAD_SECTIONS = ("seed_stock", "gear_stock", "egg_stock", "cosmetic_stock", "eventshop_stock", "weather", "travelingmerchant_stock", "notification")
+
+class _PayloadExport:
+    def __init__(self):
+        self.version = -1
+        self.blobs: Dict[str, bytes] = {}
+        self.digest = ""
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(view: dict, fmt: str, compact: Optional[bytes]) -> bytes:
+        if fmt == "gzip":
+            return gzip.compress(compact, compresslevel=PAYLOAD_GZIP_LEVEL)
+        data = {k: v for k, v in view.items() if not k.startswith("_")}
+        if fmt == "pretty":
+            return json.dumps(data, indent=2).encode("utf-8")
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    async def get(self, fmt: str) -> Tuple[bytes, str]:
+        async with self.lock:
+            view = _SNAPSHOT.view()
+            ver = view["_meta"]["version"]
+            if ver != self.version:
+                compact = await asyncio.to_thread(self._encode, view, "compact", None)
+                self.version = ver
+                self.blobs = {"compact": compact}
+                self.digest = hashlib.blake2b(compact, digest_size=12).hexdigest()
+            blob = self.blobs.get(fmt)
+            if blob is None:
+                blob = await asyncio.to_thread(self._encode, view, fmt, self.blobs["compact"])
+                self.blobs[fmt] = blob
+            return blob, f'"{self.digest}-{fmt}"'
+
+_PAYLOAD_EXPORT = _PayloadExport()
+
+def _snapshot_empty() -> bool:
+    view = _SNAPSHOT.view()
+    return not any(view.get(k) for k in _PAYLOAD_SECTIONS)
+
+class _Metrics:
+    BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.meta: Dict[str, Tuple[str, str]] = {}
+        self.values: Dict[str, Dict[tuple, float]] = {}
+        self.hists: Dict[str, Dict[tuple, List[float]]] = {}
+        self.collectors: List[Any] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self.meta[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        series = self.values.setdefault(name, {})
+        key = tuple(sorted(labels.items())) if labels else ()
+        series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.values.setdefault(name, {})[tuple(sorted(labels.items())) if labels else ()] = value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.hists.setdefault(name, {})
+        key = tuple(sorted(labels.items())) if labels else ()
+        h = series.get(key)
+        if h is None:
+            h = series[key] = [0.0] * (len(self.BUCKETS) + 2)
+        for i, b in enumerate(self.BUCKETS):
+            if value <= b:
+                h[i] += 1
+                break
+        h[-2] += value
+        h[-1] += 1
+
+    @staticmethod
+    def _labels(key: tuple, extra: str = "") -> str:
+        parts = [k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        values: Dict[str, Dict[tuple, float]] = {n: dict(s) for n, s in self.values.items()}
+        for collect in self.collectors:
+            try:
+                for name, labels, v in collect():
+                    values.setdefault(name, {})[tuple(sorted(labels.items()))] = v
+            except Exception as e:
+                _log("metrics", f"collector error: {e}", level="error")
+        out: List[str] = []
+        for name in sorted(values):
+            kind, help_text = self.meta.get(name, ("gauge", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for key, v in values[name].items():
+                out.append(f"{name}{self._labels(key)} {v:g}")
+        for name in sorted(self.hists):
+            kind, help_text = self.meta.get(name, ("histogram", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            for key, h in self.hists[name].items():
+                acc = 0.0
+                for i, b in enumerate(self.BUCKETS):
+                    acc += h[i]
+                    le = 'le="%g"' % b
+                    out.append(f"{name}_bucket{self._labels(key, le)} {acc:g}")
+                inf = 'le="+Inf"'
+                out.append(f"{name}_bucket{self._labels(key, inf)} {h[-1]:g}")
+                out.append(f"{name}_sum{self._labels(key)} {h[-2]:g}")
+                out.append(f"{name}_count{self._labels(key)} {h[-1]:g}")
+        return "\n".join(out) + "\n"
+
+_METRICS = _Metrics()
+for _name, _kind, _help in (
+    ("gag_ws_frames_received_total", "counter", "WebSocket messages received by type"),
+    ("gag_ws_frames_decoded_total", "counter", "WebSocket text frames decoded as JSON"),
+    ("gag_ws_frames_failed_total", "counter", "WebSocket text frames that failed to decode"),
+    ("gag_ws_reconnects_total", "counter", "Upstream WebSocket reconnect attempts"),
+    ("gag_ws_backoff_seconds", "gauge", "Current upstream reconnect backoff"),
+    ("gag_ws_stalls_total", "counter", "Upstream connections dropped by the stall watchdog"),
+    ("gag_ws_connect_seconds", "histogram", "Upstream WebSocket handshake and subscribe duration"),
+    ("gag_ws_recover_seconds", "histogram", "Time from losing an upstream to its first data frame after reconnecting"),
+    ("gag_ws_connected", "gauge", "1 while an upstream WebSocket is connected, by source"),
+    ("gag_upstream_frames_total", "counter", "Upstream frame sections by source and result"),
+    ("gag_upstream_lag_seconds", "histogram", "Delay of a duplicate section behind the source that delivered it first"),
+    ("gag_ws_last_frame_age_seconds", "gauge", "Seconds since the last upstream frame"),
+    ("gag_parse_seconds", "histogram", "Payload parse latency by category"),
+    ("gag_dispatch_seconds", "histogram", "Dispatch latency by category"),
+    ("gag_send_queue_depth", "gauge", "Messages waiting in per-channel send lanes"),
+    ("gag_send_latency_seconds", "histogram", "Time from enqueue to Discord acknowledgement"),
+    ("gag_send_api_seconds", "histogram", "Discord message create call duration"),
+    ("gag_send_total", "counter", "Messages delivered to Discord"),
+    ("gag_send_errors_total", "counter", "Discord send failures by kind"),
+    ("gag_send_ratelimited_total", "counter", "Discord 429 responses"),
+    ("gag_send_coalesced_total", "counter", "Queued messages replaced by a newer one"),
+    ("gag_send_merged_total", "counter", "Posts folded into another post to the same channel in one frame"),
+    ("gag_dedupe_total", "counter", "Dedupe and suppression checks by path and result"),
+    ("gag_frame_buffer_total", "counter", "Frame buffer events"),
+    ("gag_frame_buffer_pending", "gauge", "Entries waiting in the frame buffer"),
+    ("gag_timers_pending", "gauge", "Scheduled debounce, suppression and expiry timers"),
+    ("gag_timers_fired_total", "counter", "Timers that reached their deadline"),
+    ("gag_dm_alerts_total", "counter", "Item alert DMs by result"),
+    ("gag_dm_subscriptions", "gauge", "Active per-user item subscriptions"),
+    ("gag_cache_entries", "gauge", "Entries held by bounded module caches"),
+    ("gag_cache_evictions_total", "counter", "Bounded cache evictions by cache and reason"),
+    ("gag_render_lines_total", "counter", "Stock post lines served from the render cache or rendered"),
+    ("gag_log_lines_total", "counter", "Structured log lines by result"),
+):
+    _METRICS.describe(_name, _kind, _help)
+
+def _dedupe(path: str, hit: bool):
+    _METRICS.inc("gag_dedupe_total", path=path, result="hit" if hit else "miss")
+
+class _Timers:
+    def __init__(self):
+        self.heap: List[tuple] = []
+        self.entries: Dict[Any, tuple] = {}
+        self.seq = 0
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.armed_at = 0.0
+        self.fired = 0
+        self.tasks: set = set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def call_at(self, key, when: float, callback):
+        self.seq += 1
+        self.entries[key] = (when, self.seq, callback)
+        heapq.heappush(self.heap, (when, self.seq, key))
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(w, n, k) for k, (w, n, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+        if self.handle is None or when < self.armed_at:
+            self._arm()
+
+    def call_later(self, key, delay: float, callback):
+        self.call_at(key, time.time() + delay, callback)
+
+    def cancel(self, key) -> bool:
+        return self.entries.pop(key, None) is not None
+
+    def pending(self, key) -> bool:
+        return key in self.entries
+
+    def _arm(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        while self.heap:
+            when, seq, key = self.heap[0]
+            e = self.entries.get(key)
+            if e is not None and e[1] == seq:
+                self.armed_at = when
+                self.handle = asyncio.get_running_loop().call_later(max(0.0, when - time.time()), self._fire)
+                return
+            heapq.heappop(self.heap)
+
+    def _fire(self):
+        self.handle = None
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self.heap)
+            e = self.entries.get(key)
+            if e is None or e[1] != seq:
+                continue
+            del self.entries[key]
+            self.fired += 1
+            try:
+                r = e[2]()
+                if asyncio.iscoroutine(r):
+                    task = asyncio.ensure_future(r)
+                    self.tasks.add(task)
+                    task.add_done_callback(self._done)
+            except Exception as ex:
+                _log("timers", f"callback {key!r} failed: {ex}", level="error")
+        self._arm()
+
+    def _done(self, task: asyncio.Future):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _log("timers", f"callback failed: {task.exception()}", level="error")
+
+_TIMERS = _Timers()
+
+def _sweep_caches():
+    for c in _CACHES:
+        c.sweep()
+    _TIMERS.call_later("cache_sweep", CACHE_SWEEP_SEC, _sweep_caches)
+
 _SEND_RPS = float(os.getenv("SEND_RPS", "4"))
+SEND_BURST = int(os.getenv("SEND_BURST", "5"))
+SEND_GLOBAL_RPS = float(os.getenv("SEND_GLOBAL_RPS", "45"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "2"))
+SEND_MERGE = os.getenv("SEND_MERGE", "1") == "1"
 
-async def _send_worker():
-    gap = max(0.25, 1.0 / _SEND_RPS)
-    while True:
-        ch, kwargs = await _SEND_Q.get()
+class _TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(0.01, float(rate))
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= 1.0
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+
+PRIO_URGENT, PRIO_STOCK, PRIO_DEBUG = 0, 1, 2
+
+class _ChannelLane:
+    __slots__ = ("channel", "queues", "pending", "bucket", "task")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queues = (deque(), deque(), deque())
+        self.pending: Dict[str, list] = {}
+        self.bucket = _TokenBucket(_SEND_RPS, SEND_BURST)
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues)
+
+    def put(self, kwargs: dict, priority: int, coalesce: Optional[str], op=None, group: Optional[int] = None) -> bool:
+        if coalesce is not None:
+            entry = self.pending.get(coalesce)
+            if entry is not None:
+                entry[0] = kwargs
+                entry[1] = 0
+                entry[5] = op
+                entry[6] = (entry[6] or group) if group is not None else None
+                return False
+        entry = [kwargs, 0, coalesce, min(max(priority, PRIO_URGENT), PRIO_DEBUG), time.perf_counter(), op, group]
+        if coalesce is not None:
+            self.pending[coalesce] = entry
+        self.queues[entry[3]].append(entry)
+        return True
+
+    def pop(self) -> Optional[list]:
+        for q in self.queues:
+            if q:
+                entry = q.popleft()
+                if entry[2] is not None and self.pending.get(entry[2]) is entry:
+                    del self.pending[entry[2]]
+                return entry
+        return None
+
+    def take_group(self, first: list) -> List[list]:
+        parts = [first]
+        chars = len(first[0].get("content") or "")
+        embeds = len(first[0].get("embeds") or ())
+        for q in self.queues:
+            for entry in [e for e in q if e[6] == first[6]]:
+                content = entry[0].get("content") or ""
+                n = len(entry[0].get("embeds") or ())
+                sep = 2 if chars and content else 0
+                if chars + sep + len(content) > 2000 or embeds + n > 10:
+                    continue
+                q.remove(entry)
+                if entry[2] is not None and self.pending.get(entry[2]) is entry:
+                    del self.pending[entry[2]]
+                parts.append(entry)
+                chars += sep + len(content)
+                embeds += n
+        return parts
+
+    def retry(self, entry: list):
+        entry[1] += 1
+        key = entry[2]
+        if key is not None:
+            if key in self.pending:
+                return
+            self.pending[key] = entry
+        self.queues[entry[3]].appendleft(entry)
+
+_GLOBAL_BUCKET = _TokenBucket(SEND_GLOBAL_RPS, SEND_GLOBAL_RPS)
+_LANES: Dict[int, _ChannelLane] = {}
+_SEND_STATS: Dict[str, int] = {"queued": 0, "coalesced": 0}
+
+async def _lane_worker(lane: _ChannelLane):
+    try:
+        while True:
+            entry = lane.pop()
+            if entry is None:
+                break
+            wait = max(lane.bucket.reserve(), _GLOBAL_BUCKET.reserve())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            parts = lane.take_group(entry) if entry[6] is not None else [entry]
+            kwargs, attempt = (entry[0] if len(parts) == 1 else _merge_kwargs([p[0] for p in parts])), entry[1]
+            try:
+                t0 = time.perf_counter()
+                await (entry[5] or lane.channel.send)(**kwargs)
+                t1 = time.perf_counter()
+                _METRICS.observe("gag_send_api_seconds", t1 - t0)
+                for p in parts:
+                    _METRICS.observe("gag_send_latency_seconds", t1 - p[4])
+                _METRICS.inc("gag_send_total")
+                if len(parts) > 1:
+                    _METRICS.inc("gag_send_merged_total", len(parts) - 1)
+            except discord.RateLimited as e:
+                _METRICS.inc("gag_send_ratelimited_total")
+                lane.bucket.block(e.retry_after)
+                if attempt < SEND_MAX_RETRIES:
+                    for p in reversed(parts):
+                        lane.retry(p)
+                else:
+                    _METRICS.inc("gag_send_errors_total", kind="ratelimited")
+                    _log("send", f"rate limited on channel {lane.channel.id}; dropping after {attempt + 1} attempts", level="warning")
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    _METRICS.inc("gag_send_ratelimited_total")
+                else:
+                    _METRICS.inc("gag_send_errors_total", kind="http")
+                if e.status == 429 and attempt < SEND_MAX_RETRIES:
+                    lane.bucket.block(float(e.response.headers.get("Retry-After", 1)) if e.response is not None else 1.0)
+                    for p in reversed(parts):
+                        lane.retry(p)
+                else:
+                    _log("send", f"error on channel {lane.channel.id}: {e}", level="error")
+            except Exception as e:
+                _METRICS.inc("gag_send_errors_total", kind="other")
+                _log("send", f"error on channel {getattr(lane.channel, 'id', '?')}: {e}", level="error")
+    finally:
+        lane.task = None
+
+async def _safe_send(ch, priority: int = PRIO_STOCK, coalesce: Optional[str] = None, op=None,
+                     outbox: Optional["_FrameOutbox"] = None, group: Optional[int] = None, **kwargs):
+    if outbox is not None and op is None and kwargs.keys() <= _MERGEABLE:
+        outbox.add(ch, priority, coalesce, kwargs)
+        return
+    lane = _LANES.get(ch.id)
+    if lane is None:
+        lane = _LANES[ch.id] = _ChannelLane(ch)
+    lane.channel = ch
+    if lane.put(kwargs, priority, coalesce, op, group):
+        _SEND_STATS["queued"] += 1
+    else:
+        _SEND_STATS["coalesced"] += 1
+    if lane.task is None:
+        lane.task = asyncio.create_task(_lane_worker(lane))
+
+_MERGEABLE = frozenset(("content", "embeds", "allowed_mentions"))
+
+def _merge_mentions(parts: List[dict]) -> Optional[AllowedMentions]:
+    ams = [p["allowed_mentions"] for p in parts if p.get("allowed_mentions") is not None]
+    if not ams:
+        return None
+    if any(am.roles is True for am in ams):
+        return AllowedMentions(everyone=False, users=False, roles=True)
+    roles = {r.id: r for am in ams if isinstance(am.roles, list) for r in am.roles}
+    return AllowedMentions(everyone=False, users=False, roles=list(roles.values()))
+
+def _merge_kwargs(parts: List[dict]) -> dict:
+    merged: dict = {}
+    content = "\n\n".join(k["content"] for k in parts if k.get("content"))
+    if content:
+        merged["content"] = content
+    embeds = [e for k in parts for e in (k.get("embeds") or ())]
+    if embeds:
+        merged["embeds"] = embeds
+    am = _merge_mentions(parts)
+    if am is not None:
+        merged["allowed_mentions"] = am
+    return merged
+
+class _FrameOutbox:
+    groups = 0
+
+    def __init__(self):
+        _FrameOutbox.groups += 1
+        self.group = _FrameOutbox.groups
+        self.posts: List[tuple] = []
+
+    def add(self, ch, priority: int, coalesce: Optional[str], kwargs: dict):
+        self.posts.append((ch, priority, coalesce, kwargs))
+
+    async def flush(self):
+        posts, self.posts = self.posts, []
+        for ch, priority, coalesce, kwargs in sorted(posts, key=itemgetter(1)):
+            await _safe_send(ch, priority, coalesce, group=self.group, **kwargs)
+
+
+BOT_MODE = os.getenv("BOT_MODE", "single").strip().lower()
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+SHARD_ID = int(os.getenv("SHARD_ID", "0"))
+SHARD_IPC_PATH = os.getenv("SHARD_IPC_PATH", "/tmp/grow_garden_ipc.sock")
+SHARD_IPC_MAX_BUFFER = int(os.getenv("SHARD_IPC_MAX_BUFFER", str(4 * 1024 * 1024)))
+SHARD_BACKOFF_SEC = float(os.getenv("SHARD_BACKOFF_SEC", "5"))
+SHARD_HEALTHY_SEC = float(os.getenv("SHARD_HEALTHY_SEC", "60"))
+_EXIT_LOGIN_FAILED = 2
+LEASE_BACKEND = os.getenv("LEASE_BACKEND", "sqlite").strip().lower()
+LEASE_PATH = os.getenv("LEASE_PATH", "/tmp/grow_garden_discord.lease")
+LEASE_NAME = os.getenv("LEASE_NAME", "grow-garden-discord")
+LEASE_TTL_SEC = float(os.getenv("LEASE_TTL_SEC", "15"))
+LEASE_RENEW_SEC = float(os.getenv("LEASE_RENEW_SEC", "5"))
+
+class _SqliteLease:
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return conn
+
+    def acquire(self, name: str, holder: str, ttl: float) -> bool:
+        now = time.time()
+        conn = self._connect()
         try:
-            await ch.send(**kwargs)
-            await asyncio.sleep(gap)
-        except Exception as e:
-            print(f"[send] error: {e}")
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] == holder or row[1] < now:
+                conn.execute("INSERT OR REPLACE INTO lease (name, holder, expires_at) VALUES (?, ?, ?)", (name, holder, now + ttl))
+                conn.execute("COMMIT")
+                return True
+            conn.execute("ROLLBACK")
+            return False
         finally:
-            _SEND_Q.task_done()
+            conn.close()
 
-async def _safe_send(ch, **kwargs):
-    await _SEND_Q.put((ch, kwargs))
+    renew = acquire
 
-LOCK_PATH = "/tmp/grow_garden_discord.lock"
+    def release(self, name: str, holder: str):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (name, holder))
+        finally:
+            conn.close()
 
-def _acquire_singleton_lock() -> bool:
-    try:
-        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-        os.write(fd, str(os.getpid()).encode())
-        os.close(fd)
-        print("[lock] acquired singleton lock")
+class _NoLease:
+    def __init__(self, _path: str = ""):
+        pass
+
+    def acquire(self, name: str, holder: str, ttl: float) -> bool:
         return True
-    except FileExistsError:
-        print("[lock] another instance is active; skipping Discord login")
-        return False
-
-CATEGORY_CHANNELS = {
-    "seeds":     int(os.getenv("CHANNEL_SEEDS", "0")),
-    "pets":      int(os.getenv("CHANNEL_PETS", "0")),
-    "cosmetics": int(os.getenv("CHANNEL_COSMETICS", "0")),
-    "weathers":  int(os.getenv("CHANNEL_WEATHERS", "0")),
-    "gears":     int(os.getenv("CHANNEL_GEARS", "0")),
-    "merchant":  int(os.getenv("CHANNEL_MERCHANT", "0")),
-}
+
+    renew = acquire
+
+    def release(self, name: str, holder: str):
+        pass
+
+LEASE_BACKENDS: Dict[str, Any] = {"sqlite": _SqliteLease, "none": _NoLease}
+
+class _LeaderElector:
+    def __init__(self, backend, name: str, holder: str, ttl: float, renew_every: float):
+        self.backend = backend
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.renew_every = max(0.5, min(renew_every, ttl / 2))
+        self.is_leader = False
+
+    async def _call(self, fn) -> bool:
+        try:
+            return bool(await asyncio.to_thread(fn, self.name, self.holder, self.ttl))
+        except Exception as e:
+            _log("lease", f"backend error: {e}", level="error")
+            return False
+
+    async def wait_leader(self):
+        announced = False
+        while not await self._call(self.backend.acquire):
+            if not announced:
+                _log("lease", f"another instance holds {self.name}; standing by")
+                announced = True
+            await asyncio.sleep(self.renew_every)
+        self.is_leader = True
+        _log("lease", f"acquired {self.name} as {self.holder}")
+
+    async def keep(self):
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.renew_every)
+            if await self._call(self.backend.renew):
+                renewed_at = time.monotonic()
+            elif time.monotonic() - renewed_at >= self.ttl - self.renew_every:
+                self.is_leader = False
+                _log("lease", f"lost {self.name}", level="warning")
+                return
+
+    def release(self):
+        if self.is_leader:
+            try:
+                self.backend.release(self.name, self.holder)
+            except Exception as e:
+                _log("lease", f"release failed: {e}", level="error")
+            self.is_leader = False
+
+def _make_elector() -> _LeaderElector:
+    backend_cls = LEASE_BACKENDS.get(LEASE_BACKEND)
+    if backend_cls is None:
+        _log("lease", f"unknown LEASE_BACKEND={LEASE_BACKEND}; using sqlite", level="warning")
+        backend_cls = _SqliteLease
+    holder = f"{socket.gethostname()}:{os.getpid()}"
+    return _LeaderElector(backend_cls(LEASE_PATH), LEASE_NAME, holder, LEASE_TTL_SEC, LEASE_RENEW_SEC)
+
+def _parse_channel_ids(raw) -> List[int]:
+    if isinstance(raw, (int, str)):
+        raw = str(raw).replace(";", ",").split(",")
+    out: List[int] = []
+    for p in raw or []:
+        p = str(p).strip()
+        if p.isdigit() and int(p) and int(p) not in out:
+            out.append(int(p))
+    return out
+
+CHANNELS_CONFIG_PATH = os.getenv("CHANNELS_CONFIG_PATH", "channels_config.json")
+
+def _load_channel_subscriptions(strict: bool = False) -> Dict[str, List[int]]:
+    try:
+        with open(CHANNELS_CONFIG_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {str(cat).lower().strip(): _parse_channel_ids(ids) for cat, ids in (data or {}).items()}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        if strict:
+            raise
+        _log("config", f"failed to read {CHANNELS_CONFIG_PATH}: {e}", level="warning")
+        return {}
+
+def build_category_fanout(strict: bool = False) -> Dict[str, List[int]]:
+    subs = _load_channel_subscriptions(strict)
+    fanout: Dict[str, List[int]] = {}
+    for cat in ("seeds", "pets", "cosmetics", "weathers", "gears", "merchant"):
+        ids = _parse_channel_ids(os.getenv(f"CHANNEL_{cat.upper()}", ""))
+        for cid in subs.get(cat, []):
+            if cid not in ids:
+                ids.append(cid)
+        fanout[cat] = ids
+    return fanout
+
+CATEGORY_FANOUT = build_category_fanout()
+CATEGORY_CHANNELS = {cat: (ids[0] if ids else 0) for cat, ids in CATEGORY_FANOUT.items()}
 ALIAS = {
     "egg": "pets", "eggs": "pets",
     "weather": "weathers", "weathers": "weathers",
@@ -90,9 +870,9 @@ ROLE_PREFIX_PETS      = os.getenv("ROLE_PREFIX_PETS", "")
 ROLE_PREFIX_GEARS     = os.getenv("ROLE_PREFIX_GEARS", "")
 ROLE_PREFIX_MERCHANT  = os.getenv("ROLE_PREFIX_MERCHANT", "")
 ROLE_PREFIX_WEATHERS  = os.getenv("ROLE_PREFIX_WEATHERS", "")
-_ROLE_CACHE: Dict[int, Dict[str, discord.Role]] = {}
+_ROLE_CACHE = _BoundedDict("role_cache", 2000, 6 * 3600)
 
-ADMIN_ABUSE_WEATHERS = {
+_DEFAULT_ADMIN_ABUSE_WEATHERS = {
     "SummerHarvest",
     "Mega Harvest",
     "SpaceTravel",
@@ -163,7 +943,7 @@ ADMIN_ABUSE_WEATHERS = {
     "ShootingStars"
 }
 ADMIN_ABUSE_ROLE_NAME = "Admin Abuse"
-SPECIAL_WEATHER_NAMES = {
+_DEFAULT_SPECIAL_WEATHER_NAMES = {
     "SummerHarvest": "Summer Harvest",
     "AuroraBorealis": "Aurora Borealis",
     "TropicalRain": "Tropical Rain",
@@ -224,11 +1004,34 @@ SPECIAL_WEATHER_NAMES = {
     "MarrowMoon": "Marrow Moon",
     "ShootingStars": "Shooting Stars"
 }
+WEATHERS_CONFIG_PATH = os.getenv("WEATHERS_CONFIG_PATH", "weathers_config.json")
+_WEATHER_NORM_RE = re.compile(r"[^a-z0-9]+")
+
+def _weather_norm(s: str) -> str:
+    return _WEATHER_NORM_RE.sub("", str(s).lower())
+
+def build_weather_tables(strict: bool = False) -> Tuple[frozenset, Dict[str, str], Dict[str, str]]:
+    abuse = set(_DEFAULT_ADMIN_ABUSE_WEATHERS)
+    names = dict(_DEFAULT_SPECIAL_WEATHER_NAMES)
+    try:
+        with open(WEATHERS_CONFIG_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        abuse.update(str(w) for w in data.get("admin_abuse") or ())
+        names.update({str(k): str(v) for k, v in (data.get("names") or {}).items()})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        if strict:
+            raise
+        _log("config", f"failed to read {WEATHERS_CONFIG_PATH}: {e}", level="warning")
+    return frozenset(_weather_norm(w) for w in abuse), names, {_weather_norm(k): v for k, v in names.items()}
+
+ADMIN_ABUSE_WEATHERS, SPECIAL_WEATHER_NAMES, _WEATHER_DISPLAY = build_weather_tables()
 
 def repair_weather_name(raw: str) -> str:
     if not raw:
         return "(unknown)"
-    return SPECIAL_WEATHER_NAMES.get(raw, raw)
+    return SPECIAL_WEATHER_NAMES.get(raw) or _WEATHER_DISPLAY.get(_weather_norm(raw), raw)
 
 def _map_cat(s: Optional[str]) -> Optional[str]:
     if not s: return None
@@ -239,62 +1042,584 @@ def _color(cat: str) -> int:
     return {"seeds":0x2ecc71,"pets":0x3498db,"cosmetics":0x9b59b6,"weathers":0xf1c40f,"gears":0xe67e22,"merchant":0x1abc9c}.get(cat,0x95a5a6)
 
 intents = Intents.default()
-bot = discord.Client(intents=intents)
+if BOT_MODE == "sender":
+    bot = discord.Client(intents=intents, shard_id=SHARD_ID, shard_count=SHARD_COUNT)
+else:
+    bot = discord.Client(intents=intents)
 tree = app_commands.CommandTree(bot)
-_last_batch_hash: Dict[str, str] = {}
-_last_item_hash: Dict[Tuple[str, str], str] = {}
-_last_weather_hash: Optional[str] = None
+_last_batch_hash: Dict[str, tuple] = {}
+_last_item_hash = _BoundedDict("item_hash", 4096, 86400)
+_last_weather_hash: Optional[tuple] = None
 _last_presence: Dict[str, bool] = {"merchant": False}
 _last_merchant_name: Optional[str] = None
-_last_cosmetics_sig: Optional[str] = None
+_last_cosmetics_sig: Optional[tuple] = None
 MERCHANT_SUPPRESS_MINUTES = int(os.getenv("MERCHANT_SUPPRESS_MINUTES", "30"))
 _last_merchant_name: Optional[str] = None
-_last_merchant_sig: Optional[str] = None
+_last_merchant_sig: Optional[tuple] = None
 _last_merchant_at: float = 0.0
 SINGLE_ITEM_DEBOUNCE_SEC = int(os.getenv("SINGLE_ITEM_DEBOUNCE_SEC", "5"))
-_last_announced_snapshot: Dict[str, Dict[str, int]] = {"seeds": {}, "pets": {}, "gears": {}}
-_single_change_debounce: Dict[str, Dict[str, Any]] = {}
-_weather_suppress_until: Dict[str, int] = {}
+_last_announced_snapshot: Dict[str, "_StockSnapshot"] = {}
+_single_change_debounce: Dict[str, List[dict]] = {}
+_weather_suppress_until = _BoundedDict("weather_suppress", 512, on_evict=lambda raw_id: _TIMERS.cancel(("weather", raw_id)))
 DEFAULT_WEATHER_SUPPRESS_FALLBACK = int(os.getenv("WEATHER_SUPPRESS_FALLBACK_SEC", "180"))
 
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.sqlite3")
+STATE_FLUSH_SEC = float(os.getenv("STATE_FLUSH_SEC", "2"))
+STATE_SNAPSHOT_SEC = float(os.getenv("STATE_SNAPSHOT_SEC", "300"))
+STATE_COMPACT_ROWS = int(os.getenv("STATE_COMPACT_ROWS", "1000"))
+SNAPSHOT_PERSIST_SEC = float(os.getenv("SNAPSHOT_PERSIST_SEC", "300"))
+
+def _to_tuple(v):
+    if isinstance(v, list):
+        return tuple(_to_tuple(x) for x in v)
+    return v
+
+class _StateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.pending: Dict[str, Any] = {}
+        self.mirror: Dict[str, str] = {}
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+        self.journal_rows = 0
+        self.compacted_at = time.monotonic()
+
+    def open(self) -> Dict[str, Any]:
+        if not self.path:
+            return {}
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, value TEXT NOT NULL)")
+        self.mirror = dict(conn.execute("SELECT key, value FROM snapshot"))
+        rows = conn.execute("SELECT key, value FROM journal ORDER BY seq").fetchall()
+        self.mirror.update(rows)
+        self.journal_rows = len(rows)
+        self.conn = conn
+        out: Dict[str, Any] = {}
+        for k, v in self.mirror.items():
+            try:
+                out[k] = json.loads(v)
+            except Exception as e:
+                _log("state", f"skipping unreadable key {k}: {e}", level="warning")
+        return out
+
+    def record(self, key: str, value: Any):
+        if self.path:
+            self.pending[key] = value
+
+    def _write(self, batch: Dict[str, Any]):
+        rows = [(k, json.dumps(v, separators=(",", ":"), default=str)) for k, v in batch.items()]
+        with self.lock:
+            if self.conn is None:
+                return
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT INTO journal (key, value) VALUES (?, ?)", rows)
+            self.conn.execute("COMMIT")
+            self.mirror.update(rows)
+            self.journal_rows += len(rows)
+            if self.journal_rows >= STATE_COMPACT_ROWS or time.monotonic() - self.compacted_at >= STATE_SNAPSHOT_SEC:
+                self._compact()
+
+    def _compact(self):
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR REPLACE INTO snapshot (key, value) VALUES (?, ?)", list(self.mirror.items()))
+        self.conn.execute("DELETE FROM journal")
+        self.conn.execute("COMMIT")
+        self.journal_rows = 0
+        self.compacted_at = time.monotonic()
+
+    async def flush(self):
+        if self.conn is None or not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            _log("state", f"flush failed: {e}", level="error")
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            batch, self.pending = self.pending, {}
+            if batch:
+                self._write(batch)
+            with self.lock:
+                self._compact()
+                self.conn.close()
+        except Exception as e:
+            _log("state", f"close failed: {e}", level="error")
+        self.conn = None
+
+_STATE = _StateStore(STATE_DB_PATH)
+
+async def _state_flusher():
+    while True:
+        await asyncio.sleep(STATE_FLUSH_SEC)
+        await _STATE.flush()
+
+def _restore_state():
+    global _last_cosmetics_sig, _last_weather_hash, _last_merchant_name, _last_merchant_sig, _last_merchant_at
+    t0 = time.perf_counter()
+    try:
+        state = _STATE.open()
+    except Exception as e:
+        _log("state", f"cannot open {STATE_DB_PATH}: {e}; running without persistence", level="warning")
+        _STATE.path = ""
+        return
+    for k, v in state.items():
+        if k.startswith("batch:"):
+            _last_batch_hash[k[6:]] = _to_tuple(v)
+        elif k.startswith("announced:"):
+            _last_announced_snapshot[k[10:]] = _StockSnapshot(_to_tuple(v))
+        elif k == "cosmetics":
+            _last_cosmetics_sig = _to_tuple(v)
+        elif k == "weather_hash":
+            _last_weather_hash = _to_tuple(v)
+        elif k == "weather_suppress" and isinstance(v, dict):
+            for n, t in v.items():
+                _suppress_weather(str(n), int(t))
+        elif k == "merchant" and isinstance(v, dict):
+            _last_merchant_name = v.get("name")
+            _last_merchant_sig = _to_tuple(v.get("sig"))
+            _last_merchant_at = float(v.get("at") or 0.0)
+            _suppress_merchant(_last_merchant_at)
+        elif k.startswith("board:") and isinstance(v, dict):
+            cid, _, cat = k[6:].partition(":")
+            board = _BOARDS[(int(cid), cat)] = _Board()
+            board.message_id = int(v.get("id") or 0)
+            board.roles = {int(r) for r in v.get("roles") or ()}
+        elif k.startswith("subs:") and isinstance(v, list):
+            _DM.load(int(k[5:]), v)
+        elif k == "snapshot" and isinstance(v, dict):
+            _SNAPSHOT.apply(v, updated_at=(v.get("_meta") or {}).get("updated_at") or 0)
+    if state:
+        _log("state", f"restored {len(state)} keys from {STATE_DB_PATH} in {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+def _persist_merchant():
+    _STATE.record("merchant", {"name": _last_merchant_name, "sig": _last_merchant_sig, "at": _last_merchant_at})
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "history.sqlite3")
+HISTORY_FLUSH_SEC = float(os.getenv("HISTORY_FLUSH_SEC", "30"))
+_RECORD_HISTORY = BOT_MODE != "sender"
+INGEST_HTTP_URL = os.getenv("INGEST_HTTP_URL", f"http://127.0.0.1:{os.getenv('PORT', '10000')}").rstrip("/")
+
+class _History:
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[Tuple[str, str]] = []
+        self.ids: Dict[Tuple[str, str], int] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        self.ts = array("q")
+        self.item = array("I")
+        self.qty = array("I")
+        self.postings: Dict[int, array] = {}
+        self.last: Dict[str, tuple] = {}
+        self.pending: List[Tuple[int, str, tuple]] = []
+        self.saved_rows = 0
+        self.saved_names = 0
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def observe(self, category: str, pairs: tuple, ts: Optional[int] = None) -> Optional[int]:
+        if self.last.get(category) == pairs:
+            return None
+        self.last[category] = pairs
+        ts = int(time.time()) if ts is None else int(ts)
+        self.pending.append((ts, category, pairs))
+        return ts
+
+    def frames(self):
+        names, ts, item, qty = self.names, self.ts, self.item, self.qty
+        i, n = 0, len(ts)
+        while i < n:
+            t, category = ts[i], names[item[i]][0]
+            j = i
+            pairs = []
+            while j < n and ts[j] == t and names[item[j]][0] == category:
+                pairs.append((names[item[j]][1], qty[j]))
+                j += 1
+            yield t, category, pairs
+            i = j
+
+    def _id(self, category: str, name: str) -> int:
+        key = (category, name)
+        iid = self.ids.get(key)
+        if iid is None:
+            iid = self.ids[key] = len(self.names)
+            self.names.append(key)
+            self.by_name.setdefault(name.lower(), []).append(iid)
+            self.postings[iid] = array("I")
+        return iid
+
+    def _append(self, ts: int, iid: int, qty: int):
+        self.postings[iid].append(len(self.ts))
+        self.ts.append(ts)
+        self.item.append(iid)
+        self.qty.append(max(0, qty))
+
+    def _absorb(self):
+        batch, self.pending = self.pending, []
+        for ts, category, pairs in batch:
+            for name, qty in pairs:
+                self._append(ts, self._id(category, name), qty)
+
+    def open(self):
+        if not self.path:
+            return
+        t0 = time.perf_counter()
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, category TEXT NOT NULL, name TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS chunks (seq INTEGER PRIMARY KEY AUTOINCREMENT, t0 INTEGER NOT NULL, rows INTEGER NOT NULL, ts BLOB NOT NULL, item BLOB NOT NULL, qty BLOB NOT NULL)")
+        for iid, category, name in conn.execute("SELECT id, category, name FROM items ORDER BY id"):
+            if self._id(category, name) != iid:
+                raise ValueError(f"history item ids out of sequence at {iid}")
+        for t0_, rows, ts_b, item_b, qty_b in conn.execute("SELECT t0, rows, ts, item, qty FROM chunks ORDER BY seq"):
+            deltas, items, qtys = array("I"), array("I"), array("I")
+            deltas.frombytes(zlib.decompress(ts_b))
+            items.frombytes(zlib.decompress(item_b))
+            qtys.frombytes(zlib.decompress(qty_b))
+            base = len(self.ts)
+            self.ts.extend(accumulate(deltas, initial=t0_))
+            self.ts.pop(base)
+            self.item.extend(items)
+            self.qty.extend(qtys)
+            postings = self.postings
+            for i, iid in enumerate(items, base):
+                postings[iid].append(i)
+        self.saved_rows = len(self.ts)
+        self.saved_names = len(self.names)
+        self.conn = conn
+        if self.saved_rows:
+            _log("history", f"loaded {self.saved_rows} rows / {self.saved_names} items from {self.path} in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    def _write(self, names: List[Tuple[int, str, str]], t0: int, ts: array, items: array, qtys: array):
+        deltas = array("I")
+        prev = t0
+        for t in ts:
+            deltas.append(max(0, t - prev))
+            prev = t
+        with self.lock:
+            if self.conn is None:
+                return
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT INTO items (id, category, name) VALUES (?, ?, ?)", names)
+            if len(ts):
+                self.conn.execute("INSERT INTO chunks (t0, rows, ts, item, qty) VALUES (?, ?, ?, ?, ?)",
+                                  (t0, len(ts), zlib.compress(deltas.tobytes()), zlib.compress(items.tobytes()), zlib.compress(qtys.tobytes())))
+            self.conn.execute("COMMIT")
+
+    async def flush(self):
+        self._absorb()
+        if self.conn is None or self.saved_rows == len(self.ts):
+            return
+        lo, hi = self.saved_rows, len(self.ts)
+        names = [(i, c, n) for i, (c, n) in enumerate(self.names[self.saved_names:], self.saved_names)]
+        self.saved_rows, self.saved_names = hi, len(self.names)
+        try:
+            await asyncio.to_thread(self._write, names, self.ts[lo], self.ts[lo:hi], self.item[lo:hi], self.qty[lo:hi])
+        except Exception as e:
+            _log("history", f"flush failed: {e}", level="error")
+
+    def close(self):
+        self._absorb()
+        if self.conn is None:
+            return
+        lo, hi = self.saved_rows, len(self.ts)
+        try:
+            names = [(i, c, n) for i, (c, n) in enumerate(self.names[self.saved_names:], self.saved_names)]
+            if names or hi > lo:
+                self._write(names, self.ts[lo] if hi > lo else 0, self.ts[lo:hi], self.item[lo:hi], self.qty[lo:hi])
+            with self.lock:
+                self.conn.close()
+        except Exception as e:
+            _log("history", f"close failed: {e}", level="error")
+        self.conn = None
+
+    def query(self, name: str, recent: int = 20) -> Optional[dict]:
+        self._absorb()
+        ids = self.by_name.get(name.strip().lower())
+        if not ids:
+            return None
+        rows = sorted(r for iid in ids for r in self.postings[iid]) if len(ids) > 1 else self.postings[ids[0]]
+        category, display = self.names[ids[0]]
+        out = {"item": display, "category": category, "appearances": 0, "last_24h": 0, "last_7d": 0,
+               "first_seen": None, "last_seen": None, "last_qty": None, "avg_qty": None, "avg_gap_sec": None, "recent": []}
+        seen = [r for r in rows if self.qty[r] > 0]
+        if not seen:
+            return out
+        ts = [self.ts[r] for r in seen]
+        now = int(time.time())
+        out.update(appearances=len(seen), last_24h=len(ts) - bisect.bisect_left(ts, now - 86400),
+                   last_7d=len(ts) - bisect.bisect_left(ts, now - 7 * 86400), first_seen=ts[0], last_seen=ts[-1],
+                   last_qty=self.qty[seen[-1]], avg_qty=round(sum(self.qty[r] for r in seen) / len(seen), 2),
+                   avg_gap_sec=(ts[-1] - ts[0]) // (len(ts) - 1) if len(ts) > 1 else None,
+                   recent=[[self.ts[r], self.qty[r]] for r in seen[-recent:]] if recent > 0 else [])
+        return out
+
+_HISTORY = _History(HISTORY_DB_PATH)
+
+PREDICT_CATEGORIES = {c.strip() for c in os.getenv("PREDICT_CATEGORIES", "seeds,gears,pets,merchant").split(",") if c.strip()}
+PREDICT_MERGE_SEC = int(os.getenv("PREDICT_MERGE_SEC", "30"))
+PREDICT_ALPHA = float(os.getenv("PREDICT_ALPHA", "0.2"))
+PREDICT_LINE = os.getenv("PREDICT_LINE", "1") == "1"
+
+class _CategoryModel:
+    __slots__ = ("restocks", "last_at", "interval")
+
+    def __init__(self):
+        self.restocks = 0
+        self.last_at = 0
+        self.interval = 0.0
+
+class _ItemModel:
+    __slots__ = ("first_idx", "seen", "last_idx", "last_at", "qty")
+
+    def __init__(self, idx: int):
+        self.first_idx = idx
+        self.seen = 0
+        self.last_idx = 0
+        self.last_at = 0
+        self.qty = 0.0
+
+class _Predictor:
+    def __init__(self):
+        self.cats: Dict[str, _CategoryModel] = {}
+        self.items: Dict[str, Tuple[str, str, _ItemModel]] = {}
+
+    def observe(self, category: str, pairs, ts: int):
+        if category not in PREDICT_CATEGORIES or not pairs:
+            return
+        cat = self.cats.get(category)
+        if cat is None:
+            cat = self.cats[category] = _CategoryModel()
+        if not cat.last_at or ts - cat.last_at >= PREDICT_MERGE_SEC:
+            gap = ts - cat.last_at
+            if cat.last_at and (not cat.interval or gap <= 3 * cat.interval):
+                cat.interval = float(gap) if not cat.interval else cat.interval + PREDICT_ALPHA * (gap - cat.interval)
+            cat.restocks += 1
+            cat.last_at = ts
+        idx = cat.restocks
+        for name, qty in pairs:
+            if qty <= 0:
+                continue
+            key = name.lower()
+            entry = self.items.get(key)
+            if entry is None or entry[0] != category:
+                entry = self.items[key] = (category, name, _ItemModel(idx))
+            m = entry[2]
+            if m.last_idx != idx:
+                m.seen += 1
+                m.last_idx = idx
+                m.qty = float(qty) if m.seen == 1 else m.qty + PREDICT_ALPHA * (qty - m.qty)
+            m.last_at = ts
+
+    def next_restock(self, category: str) -> Optional[int]:
+        cat = self.cats.get(category)
+        if cat is None or cat.restocks < 2 or not cat.interval:
+            return None
+        now = time.time()
+        nxt = cat.last_at + cat.interval
+        if nxt < now:
+            nxt += cat.interval * (int((now - nxt) // cat.interval) + 1)
+        return int(nxt)
+
+    def cadence(self) -> Dict[str, list]:
+        return {c: [m.restocks, m.last_at, m.interval] for c, m in self.cats.items()}
+
+    def adopt(self, cadence: dict):
+        for category, (restocks, last_at, interval) in cadence.items():
+            cat = self.cats.get(category)
+            if cat is None:
+                cat = self.cats[category] = _CategoryModel()
+            cat.restocks, cat.last_at, cat.interval = restocks, last_at, interval
+
+    def predict(self, name: str) -> Optional[dict]:
+        entry = self.items.get(name.strip().lower())
+        if entry is None:
+            return None
+        category, display, m = entry
+        cat = self.cats[category]
+        window = cat.restocks - m.first_idx + 1
+        p = (m.seen + 1) / (window + 2)
+        nxt = self.next_restock(category)
+        return {"item": display, "category": category, "probability": round(p, 3), "restocks": window,
+                "seen": m.seen, "in_stock": m.last_idx == cat.restocks, "last_seen": m.last_at,
+                "avg_qty": round(m.qty, 1), "interval_sec": int(cat.interval), "next_restock_at": nxt,
+                "expected_at": int(nxt + (1 / p - 1) * cat.interval) if nxt else None}
+
+    def warm(self, history: "_History"):
+        t0 = time.perf_counter()
+        n = 0
+        for ts, category, pairs in history.frames():
+            self.observe(category, pairs, ts)
+            n += 1
+        if n:
+            _log("predict", f"replayed {n} frames in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+_PREDICT = _Predictor()
+
+def _predict_line(category: str) -> str:
+    if not PREDICT_LINE:
+        return ""
+    nxt = _PREDICT.next_restock(category)
+    return f"_Next likely restock <t:{nxt}:R>_" if nxt else ""
+
+async def _history_flusher():
+    while True:
+        await asyncio.sleep(HISTORY_FLUSH_SEC)
+        await _HISTORY.flush()
+
+def _record_stock(snaps: Dict[str, "_StockSnapshot"]):
+    for cat, snap in snaps.items():
+        ts = _HISTORY.observe(cat, snap.pairs)
+        if ts is not None:
+            _PREDICT.observe(cat, snap.pairs, ts)
+
+def _record_weathers(active_weathers: List[dict]):
+    _HISTORY.observe("weathers", tuple((w["name"], 1) for w in active_weathers))
+
+async def _ingest_query(path: str, item: str, **params) -> Optional[dict]:
+    try:
+        async with ClientSession(timeout=ClientTimeout(total=3)) as session:
+            async with session.get(f"{INGEST_HTTP_URL}{path}", params={"item": item, **params}) as resp:
+                return await resp.json() if resp.status == 200 else None
+    except Exception as e:
+        _log("shard", f"cannot query ingest {path}: {e}", level="warning")
+        return None
+
+async def _open_history():
+    try:
+        await asyncio.to_thread(_HISTORY.open)
+        await asyncio.to_thread(_PREDICT.warm, _HISTORY)
+    except Exception as e:
+        _log("history", f"cannot open {HISTORY_DB_PATH}: {e}; history disabled", level="warning")
+        _HISTORY.path = ""
+
 async def _resolve_channel(cid: int):
     if not cid: return None
     ch = bot.get_channel(cid)
     if ch is None:
+        if BOT_MODE == "sender":
+            return None
         try:
             ch = await bot.fetch_channel(cid)
         except Exception as e:
-            print(f"[warn] cannot fetch channel {cid}: {e}")
+            _log("send", f"cannot fetch channel {cid}: {e}", level="warning")
             return None
     return ch
 
+async def _resolve_channels(category: str) -> list:
+    ids = CATEGORY_FANOUT.get(category) or []
+    chans = [bot.get_channel(cid) for cid in ids]
+    missing = [i for i, ch in enumerate(chans) if ch is None]
+    if missing:
+        fetched = await asyncio.gather(*(_resolve_channel(ids[i]) for i in missing))
+        for i, ch in zip(missing, fetched):
+            chans[i] = ch
+    return [ch for ch in chans if ch is not None]
+
 @tree.command(name="payload", description="Download the latest full payload snapshot (WS schema)")
-async def payload_cmd(interaction: discord.Interaction):
+@app_commands.describe(format="pretty (default), compact or gzip")
+@app_commands.choices(format=[app_commands.Choice(name=f, value=f) for f in PAYLOAD_FORMATS])
+async def payload_cmd(interaction: discord.Interaction, format: Optional[app_commands.Choice[str]] = None):
     if DEBUG_CHANNEL_ID and interaction.channel_id != DEBUG_CHANNEL_ID:
         await interaction.response.send_message(f"Please use this command in <#{DEBUG_CHANNEL_ID}>.", ephemeral=True)
         return
-    to_dump = {k: v for k, v in _state_snapshot.items() if not k.startswith("_")}
-    if (
-        not to_dump.get("seed_stock")
-        and not to_dump.get("gear_stock")
-        and not to_dump.get("egg_stock")
-        and not to_dump.get("cosmetic_stock")
-        and not to_dump.get("eventshop_stock")
-        and not to_dump.get("weather")
-        and not to_dump.get("travelingmerchant_stock")
-        and not to_dump.get("notification")
-    ):
+    if _snapshot_empty():
         await interaction.response.send_message("No snapshot captured yet.", ephemeral=True)
         return
-    buf = io.StringIO()
-    json.dump(to_dump, buf, indent=2)
-    data = buf.getvalue().encode("utf-8")
-    file = discord.File(fp=io.BytesIO(data), filename="payload.latest.json")
+    fmt = format.value if format else "pretty"
+    data, _ = await _PAYLOAD_EXPORT.get(fmt)
+    filename = "payload.latest.json.gz" if fmt == "gzip" else "payload.latest.json"
+    file = discord.File(fp=io.BytesIO(data), filename=filename)
     await interaction.response.send_message(content="Latest full payload:", file=file, ephemeral=False)
 
+async def _item_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    cur = current.strip().lower()
+    names = [n for names in CUSTOM_ORDER.values() for n in names if cur in n]
+    return [app_commands.Choice(name=n.title(), value=n.title()) for n in names[:25]]
+
+async def _subscription_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    cur = current.strip().lower()
+    names = sorted(n for n in _DM.by_user.get(interaction.user.id, ()) if cur in n)
+    return [app_commands.Choice(name=n.title(), value=n) for n in names[:25]]
+
+@tree.command(name="subscribe", description="Get a DM when an item comes into stock")
+@app_commands.describe(item="Item name, e.g. Carrot")
+@app_commands.autocomplete(item=_item_autocomplete)
+async def subscribe_cmd(interaction: discord.Interaction, item: str):
+    mine = _DM.by_user.get(interaction.user.id, ())
+    if len(mine) >= SUBSCRIBE_MAX_ITEMS and item.strip().lower() not in mine:
+        await interaction.response.send_message(f"You can follow at most {SUBSCRIBE_MAX_ITEMS} items.", ephemeral=True)
+        return
+    if _DM.add(interaction.user.id, item):
+        msg = f"You'll get a DM when **{item.strip()}** is in stock."
+    else:
+        msg = f"You're already subscribed to **{item.strip()}**."
+    await interaction.response.send_message(msg, ephemeral=True)
+
+@tree.command(name="unsubscribe", description="Stop DM alerts for an item (or all items)")
+@app_commands.describe(item="Item name; leave empty to remove every subscription")
+@app_commands.autocomplete(item=_subscription_autocomplete)
+async def unsubscribe_cmd(interaction: discord.Interaction, item: Optional[str] = None):
+    n = _DM.remove(interaction.user.id, item)
+    if not n:
+        msg = "Nothing to remove."
+    elif item:
+        msg = f"Unsubscribed from **{item.strip()}**."
+    else:
+        msg = f"Removed {n} subscription{'s' if n != 1 else ''}."
+    await interaction.response.send_message(msg, ephemeral=True)
+
+async def _history_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    if not _RECORD_HISTORY:
+        return await _item_autocomplete(interaction, current)
+    cur = current.strip().lower()
+    names = sorted({n for c, n in _HISTORY.names if cur in n.lower()})
+    return [app_commands.Choice(name=n, value=n) for n in names[:25]]
+
+@tree.command(name="history", description="Show how often an item has been in stock")
+@app_commands.describe(item="Item or weather name")
+@app_commands.autocomplete(item=_history_autocomplete)
+async def history_cmd(interaction: discord.Interaction, item: str):
+    h = _HISTORY.query(item, recent=5) if _RECORD_HISTORY else await _ingest_query("/history", item, recent="5")
+    if not h or not h["appearances"]:
+        await interaction.response.send_message(f"No stock history for **{item.strip()}** yet.", ephemeral=True)
+        return
+    lines = [
+        f"**{h['item']}** ({h['category']}) — seen {h['appearances']} time{'s' if h['appearances'] != 1 else ''} since <t:{h['first_seen']}:D>",
+        f"• last 24h: **{h['last_24h']}**, last 7d: **{h['last_7d']}**",
+        f"• last seen <t:{h['last_seen']}:R> with **{h['last_qty']}** (avg {h['avg_qty']})",
+    ]
+    if h["avg_gap_sec"]:
+        lines.append(f"• average gap: {_fmt_duration(h['avg_gap_sec']).replace(' left', '')}")
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@tree.command(name="predict", description="Estimate when an item is likely to be in stock next")
+@app_commands.describe(item="Seed, gear, egg or merchant item name")
+@app_commands.autocomplete(item=_item_autocomplete)
+async def predict_cmd(interaction: discord.Interaction, item: str):
+    pr = _PREDICT.predict(item) if _RECORD_HISTORY else await _ingest_query("/predict", item)
+    if not pr:
+        await interaction.response.send_message(f"Not enough data for **{item.strip()}** yet.", ephemeral=True)
+        return
+    lines = [f"**{pr['item']}** ({pr['category']}) — {'in stock now' if pr['in_stock'] else 'not in stock'}",
+             f"• in {pr['probability'] * 100:.0f}% of restocks ({pr['seen']}/{pr['restocks']} observed), avg qty {pr['avg_qty']}"]
+    if pr["next_restock_at"]:
+        lines.append(f"• next restock <t:{pr['next_restock_at']}:R> (every ~{_fmt_duration(pr['interval_sec']).replace(' left', '')})")
+        if not pr["in_stock"]:
+            lines.append(f"• expected around <t:{pr['expected_at']}:R>")
+    if pr["last_seen"]:
+        lines.append(f"• last seen <t:{pr['last_seen']}:R>")
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
 ORDER_CONFIG_PATH = os.getenv("ORDER_CONFIG_PATH", "order_config.json")
 
-def _load_order_from_file() -> Dict[str, Dict[str, int]]:
+def _load_order_from_file(strict: bool = False) -> Dict[str, Dict[str, int]]:
     try:
         with open(ORDER_CONFIG_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -308,7 +1633,9 @@ def _load_order_from_file() -> Dict[str, Dict[str, int]]:
     except FileNotFoundError:
         return {}
     except Exception as e:
-        print(f"[warn] failed to read {ORDER_CONFIG_PATH}: {e}")
+        if strict:
+            raise
+        _log("config", f"failed to read {ORDER_CONFIG_PATH}: {e}", level="warning")
         return {}
 
 def _parse_csv_env(name: str) -> Dict[str, int]:
@@ -317,8 +1644,8 @@ def _parse_csv_env(name: str) -> Dict[str, int]:
     parts = [p.strip().lower() for p in raw.split(",") if p.strip()]
     return {p: i for i, p in enumerate(parts)}
 
-def build_custom_order() -> Dict[str, Dict[str, int]]:
-    order = _load_order_from_file()
+def build_custom_order(strict: bool = False) -> Dict[str, Dict[str, int]]:
+    order = _load_order_from_file(strict)
     if "seeds" not in order:
         order["seeds"] = _parse_csv_env("ORDER_SEEDS")
     if "pets" not in order:
@@ -329,89 +1656,322 @@ def build_custom_order() -> Dict[str, Dict[str, int]]:
 
 CUSTOM_ORDER = build_custom_order()
 
-def sort_items(category: str, items: List[dict]) -> List[dict]:
-    pri = CUSTOM_ORDER.get(category, {})
-    if not pri:
-        return items
-    enumerated = list(enumerate(items))
+CONFIG_POLL_SEC = float(os.getenv("CONFIG_POLL_SEC", "10"))
 
-    def key(pair):
-        idx, it = pair
-        name_l = str(it.get("name","")).strip().lower()
-        return (pri.get(name_l, 10_000 + idx), idx)
+def _config_stamp() -> tuple:
+    out = []
+    for path in (ORDER_CONFIG_PATH, CHANNELS_CONFIG_PATH, WEATHERS_CONFIG_PATH):
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
 
-    enumerated.sort(key=key)
-    return [it for _, it in enumerated]
+_CONFIG_STAMP = _config_stamp()
 
-def _normalize_items(items: List[dict]) -> Dict[str, int]:
-    out: Dict[str, int] = {}
-    for it in items:
-        n = str(it.get("name", "")).strip()
-        q = it.get("qty", 0)
-        try:
-            q = int(q)
-        except Exception:
-            q = 0
-        out[n] = q
-    return out
+def _build_config() -> dict:
+    return {"order": build_custom_order(strict=True), "fanout": build_category_fanout(strict=True), "weather": build_weather_tables(strict=True)}
 
-def _changed_item_names(prev: Dict[str, int], curr: Dict[str, int]) -> set:
-    names = set(prev.keys()) | set(curr.keys())
-    return {n for n in names if prev.get(n, None) != curr.get(n, None)}
+def _apply_config(cfg: dict) -> List[str]:
+    global CUSTOM_ORDER, CATEGORY_FANOUT, CATEGORY_CHANNELS, ADMIN_ABUSE_WEATHERS, SPECIAL_WEATHER_NAMES, _WEATHER_DISPLAY
+    changes: List[str] = []
+    for cat in sorted(set(CUSTOM_ORDER) | set(cfg["order"])):
+        old, new = CUSTOM_ORDER.get(cat, {}), cfg["order"].get(cat, {})
+        if old != new:
+            changes.append(f"order {cat}: {len(old)} -> {len(new)} items")
+    for cat in sorted(set(CATEGORY_FANOUT) | set(cfg["fanout"])):
+        old, new = CATEGORY_FANOUT.get(cat, []), cfg["fanout"].get(cat, [])
+        if old != new:
+            changes.append(f"channels {cat}: {len(old)} -> {len(new)}")
+    abuse, names, display = cfg["weather"]
+    if abuse != ADMIN_ABUSE_WEATHERS or names != SPECIAL_WEATHER_NAMES:
+        changes.append(f"weathers: {len(abuse)} admin-abuse, {len(names)} names")
+    CUSTOM_ORDER = cfg["order"]
+    CATEGORY_FANOUT = cfg["fanout"]
+    CATEGORY_CHANNELS = {cat: (ids[0] if ids else 0) for cat, ids in CATEGORY_FANOUT.items()}
+    ADMIN_ABUSE_WEATHERS, SPECIAL_WEATHER_NAMES, _WEATHER_DISPLAY = abuse, names, display
+    _STOCK_KEY_CATEGORY.clear()
+    _CANDIDATE_SLUGS.clear()
+    _precompute_role_candidates()
+    return changes
 
-def _cancel_debounce(cat: str):
-    st = _single_change_debounce.get(cat)
-    if st:
-        t = st.get("task")
-        if t and not t.done():
-            t.cancel()
-    _single_change_debounce.pop(cat, None)
+async def _reload_config(reason: str) -> List[str]:
+    global _CONFIG_STAMP
+    stamp = await asyncio.to_thread(_config_stamp)
+    cfg = await asyncio.to_thread(_build_config)
+    _CONFIG_STAMP = stamp
+    changes = _apply_config(cfg)
+    _log("config", f"reloaded ({reason}): {'; '.join(changes) or 'no changes'}")
+    return changes
 
-async def _debounced_send_after(cat: str):
-    try:
-        await asyncio.sleep(SINGLE_ITEM_DEBOUNCE_SEC)
-    except asyncio.CancelledError:
-        return
-    st = _single_change_debounce.get(cat)
-    if not st:
+async def _config_watcher():
+    failed = None
+    while True:
+        await asyncio.sleep(CONFIG_POLL_SEC)
+        stamp = await asyncio.to_thread(_config_stamp)
+        if stamp == _CONFIG_STAMP or stamp == failed:
+            continue
+        try:
+            await _reload_config("file change")
+        except Exception as e:
+            failed = stamp
+            _log("config", f"reload failed, keeping current config: {e}", level="error")
+
+@tree.command(name="reload-config", description="Reload order, channel and weather config files")
+@app_commands.default_permissions(manage_guild=True)
+async def reload_config_cmd(interaction: discord.Interaction):
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can reload the config.", ephemeral=True)
         return
-    items = st.get("pending_items") or []
+    await interaction.response.defer(ephemeral=True, thinking=True)
     try:
-        await send_batch_text(cat, items)
-        _last_announced_snapshot[cat] = _normalize_items(items)
+        changes = await _reload_config(f"/reload-config by {interaction.user.id}")
     except Exception as e:
-        print(f"[debounce] send_batch_text({cat}) error: {e}")
-    finally:
-        _cancel_debounce(cat)
+        await interaction.followup.send(f"Reload failed, keeping the current config: {e}", ephemeral=True)
+        return
+    msg = "Config reloaded:\n" + "\n".join(f"• {c}" for c in changes) if changes else "Config reloaded; nothing changed."
+    await interaction.followup.send(msg, ephemeral=True)
 
-def _start_or_reset_debounce(cat: str, items: List[dict]):
-    st = _single_change_debounce.get(cat)
-    if st:
-        t = st.get("task")
-        if t and not t.done():
-            t.cancel()
-    _single_change_debounce[cat] = {"pending_items": items, "task": asyncio.create_task(_debounced_send_after(cat)),}
-
-def _signature_for_cosmetics(items: List[dict]) -> str:
-    norm = []
-    for it in items:
-        n = str(it.get("name", "")).strip().lower()
-        q = it.get("qty")
-        norm.append({"n": n, "q": q})
-    norm.sort(key=lambda d: (d["n"], d["q"] if d["q"] is not None else -1))
-    return hashlib.sha256(json.dumps(norm, sort_keys=True).encode()).hexdigest()
+_UNRANKED = 10_000
+_RANK_KEY = itemgetter("rank")
 
-def _merchant_signature(items: List[dict]) -> str:
-    norm = [{"n": str(i.get("name","")), "q": i.get("qty")} for i in items]
-    norm.sort(key=lambda x: (x["n"].lower(), x["q"] if x["q"] is not None else -1))
-    return hashlib.sha256(json.dumps(norm, sort_keys=True).encode()).hexdigest()
+_NAME_INTERN = _BoundedDict("name_intern", 8192)
 
-def _slug(s: str) -> str:
-    s = (s or "").strip().lower()
-    return re.sub(r"[^a-z0-9]+", "-", s).strip("-")
+def _intern_name(raw) -> Tuple[str, str]:
+    name = sys.intern(str(raw if raw is not None else "").strip())
+    pair = (name, sys.intern(name.lower()))
+    if type(raw) is str:
+        _NAME_INTERN[raw] = pair
+    return pair
 
-def _role_candidates(name: str, category: str) -> list[str]:
-    pref = {
+def _annotate_items(category: str, items: List[dict]):
+    ranks = CUSTOM_ORDER.get(category) or {}
+    lookup = _NAME_INTERN.peek
+    for idx, it in enumerate(items):
+        raw = it.get("name")
+        pair = (type(raw) is str and lookup(raw)) or _intern_name(raw)
+        it["name"], it["key"] = pair
+        it["rank"] = ranks.get(pair[1], _UNRANKED + idx)
+
+def sort_items(category: str, items: List[dict]) -> List[dict]:
+    if not CUSTOM_ORDER.get(category):
+        return items
+    if items and "rank" not in items[0]:
+        _annotate_items(category, items)
+    return sorted(items, key=_RANK_KEY)
+
+def _as_int(q) -> int:
+    if type(q) is int:
+        return q
+    try:
+        return int(q)
+    except Exception:
+        return 0
+
+class _StockDelta:
+    __slots__ = ("added", "removed", "changed")
+
+    def __init__(self, added: Tuple[str, ...] = (), removed: Tuple[str, ...] = (), changed: Tuple[str, ...] = ()):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def names(self) -> Tuple[str, ...]:
+        return self.added + self.removed + self.changed
+
+_NO_DELTA = _StockDelta()
+
+class _StockSnapshot:
+    __slots__ = ("pairs", "index")
+
+    def __init__(self, pairs: Tuple[Tuple[str, int], ...] = ()):
+        self.pairs = pairs
+        self.index: Dict[str, int] = dict(pairs)
+
+    @classmethod
+    def from_items(cls, items: List[dict]) -> "_StockSnapshot":
+        if items and "key" in items[0]:
+            return cls(tuple((it["name"], _as_int(it["qty"])) for it in items))
+        return cls(tuple((str(it.get("name", "")).strip(), _as_int(it.get("qty", 0))) for it in items))
+
+    def diff(self, prev: "_StockSnapshot") -> _StockDelta:
+        if self.pairs == prev.pairs:
+            return _NO_DELTA
+        old = prev.index
+        added: List[str] = []
+        changed: List[str] = []
+        for n, q in self.index.items():
+            p = old.get(n)
+            if p is None:
+                added.append(n)
+            elif p != q:
+                changed.append(n)
+        removed: Tuple[str, ...] = ()
+        if len(old) + len(added) != len(self.index):
+            curr = self.index
+            removed = tuple(n for n in old if n not in curr)
+        return _StockDelta(tuple(added), removed, tuple(changed))
+
+_EMPTY_SNAPSHOT = _StockSnapshot()
+
+def _batch_signature(items: List[dict], title_hint: Optional[str] = None) -> tuple:
+    return (title_hint, tuple((it.get("name"), it.get("qty")) for it in items))
+
+def _unordered_signature(items: List[dict], fold_case: bool) -> tuple:
+    if fold_case:
+        norm = [(it.get("key") or str(it.get("name", "")).strip().lower(), it.get("qty")) for it in items]
+        norm.sort(key=lambda p: (p[0], p[1] if p[1] is not None else -1))
+    else:
+        norm = [(str(it.get("name", "")), it.get("qty")) for it in items]
+        norm.sort(key=lambda p: (p[0].lower(), p[1] if p[1] is not None else -1))
+    return tuple(norm)
+
+DM_ALERTS = os.getenv("DM_ALERTS", "1") == "1"
+DM_RPS = float(os.getenv("DM_RPS", "1"))
+DM_BURST = int(os.getenv("DM_BURST", "5"))
+SUBSCRIBE_MAX_ITEMS = int(os.getenv("SUBSCRIBE_MAX_ITEMS", "25"))
+
+class _DmAlerts:
+    def __init__(self):
+        self.index: Dict[str, set] = {}
+        self.by_user: Dict[int, set] = {}
+        self.seen: Dict[str, _StockSnapshot] = {}
+        self.pending: Dict[int, List[str]] = {}
+        self.bucket = _TokenBucket(DM_RPS, DM_BURST)
+        self.task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"sent": 0, "failed": 0}
+
+    def load(self, uid: int, items):
+        for item in items:
+            self.add(uid, str(item), persist=False)
+
+    def add(self, uid: int, item: str, persist: bool = True) -> bool:
+        key = item.strip().lower()
+        mine = self.by_user.setdefault(uid, set())
+        if not key or key in mine:
+            return False
+        mine.add(key)
+        self.index.setdefault(key, set()).add(uid)
+        if persist:
+            _STATE.record(f"subs:{uid}", sorted(mine))
+        return True
+
+    def remove(self, uid: int, item: Optional[str] = None) -> int:
+        mine = self.by_user.get(uid) or set()
+        keys = [item.strip().lower()] if item else list(mine)
+        n = 0
+        for key in keys:
+            if key in mine:
+                mine.discard(key)
+                subs = self.index.get(key)
+                subs.discard(uid)
+                if not subs:
+                    del self.index[key]
+                n += 1
+        if not mine:
+            self.by_user.pop(uid, None)
+        if n:
+            _STATE.record(f"subs:{uid}", sorted(mine))
+        return n
+
+    def on_stock(self, category: str, snap: _StockSnapshot):
+        prev = self.seen.get(category)
+        self.seen[category] = snap
+        if prev is None or not self.index:
+            return
+        delta = snap.diff(prev)
+        if not delta:
+            return
+        old = prev.index
+        for name in delta.added + delta.changed:
+            qty = snap.index[name]
+            if qty <= 0 or old.get(name, 0) > 0:
+                continue
+            subs = self.index.get(name.lower())
+            if not subs:
+                continue
+            line = f"• {name} ({category}) — **{qty}**"
+            for uid in subs:
+                self.pending.setdefault(uid, []).append(line)
+        if self.pending and self.task is None:
+            self.task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while self.pending:
+                uid = next(iter(self.pending))
+                lines = self.pending.pop(uid)
+                wait = max(self.bucket.reserve(), _GLOBAL_BUCKET.reserve())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    user = bot.get_user(uid) or await bot.fetch_user(uid)
+                    await user.send(content="**In stock now:**\n" + "\n".join(lines)[:1980])
+                    self.stats["sent"] += 1
+                except discord.RateLimited as e:
+                    self.bucket.block(e.retry_after)
+                    self.pending.setdefault(uid, lines)
+                except discord.HTTPException as e:
+                    self.stats["failed"] += 1
+                    _log("dm", f"cannot alert user {uid}: {e}", level="warning")
+        finally:
+            self.task = None
+
+_DM = _DmAlerts()
+
+def _cancel_debounce(cat: str):
+    _TIMERS.cancel(("debounce", cat))
+    _single_change_debounce.pop(cat, None)
+
+async def _debounced_send(cat: str):
+    items = _single_change_debounce.pop(cat, None)
+    if items is None:
+        return
+    try:
+        await send_batch_text(cat, items)
+        _last_announced_snapshot[cat] = _StockSnapshot.from_items(items)
+        _STATE.record(f"announced:{cat}", _last_announced_snapshot[cat].pairs)
+    except Exception as e:
+        _log("debounce", f"send_batch_text({cat}) error: {e}", level="error")
+
+def _start_or_reset_debounce(cat: str, items: List[dict]):
+    _single_change_debounce[cat] = items
+    _TIMERS.call_later(("debounce", cat), SINGLE_ITEM_DEBOUNCE_SEC, lambda: _debounced_send(cat))
+
+def _expire_weather_suppress(raw_id: str):
+    _weather_suppress_until.pop(raw_id, None)
+    _STATE.record("weather_suppress", dict(_weather_suppress_until))
+
+def _suppress_weather(raw_id: str, until: int):
+    _weather_suppress_until[raw_id] = until
+    _TIMERS.call_at(("weather", raw_id), until, lambda: _expire_weather_suppress(raw_id))
+
+def _suppress_merchant(at: float):
+    if at:
+        _TIMERS.call_at("merchant", at + MERCHANT_SUPPRESS_MINUTES * 60, lambda: None)
+    else:
+        _TIMERS.cancel("merchant")
+
+def _signature_for_cosmetics(items: List[dict]) -> tuple:
+    return _unordered_signature(items, fold_case=True)
+
+def _merchant_signature(items: List[dict]) -> tuple:
+    return _unordered_signature(items, fold_case=False)
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_ROLE_MISS = _BoundedDict("role_miss", 2000, 6 * 3600)
+_CANDIDATE_SLUGS = _BoundedDict("candidate_slugs", 4096)
+
+def _slug(s: str) -> str:
+    s = (s or "").strip().lower()
+    return _SLUG_RE.sub("-", s).strip("-")
+
+def _role_candidates(name: str, category: str) -> list[str]:
+    pref = {
         "seeds": ROLE_PREFIX_SEEDS,
         "pets": ROLE_PREFIX_PETS,
         "gears": ROLE_PREFIX_GEARS,
@@ -427,100 +1987,204 @@ def _role_candidates(name: str, category: str) -> list[str]:
         f"{category}: {clean}",
     ] if c]
 
+def _candidate_slugs(name: str, category: str) -> Tuple[str, ...]:
+    key = (category, name.strip().lower())
+    slugs = _CANDIDATE_SLUGS.get(key)
+    if slugs is None:
+        slugs = _CANDIDATE_SLUGS[key] = tuple(dict.fromkeys(_slug(c) for c in _role_candidates(name, category)))
+    return slugs
+
+def _precompute_role_candidates():
+    for cat, names in CUSTOM_ORDER.items():
+        for name in names:
+            _candidate_slugs(name, cat)
+    _candidate_slugs(ADMIN_ABUSE_ROLE_NAME, "weathers")
+    for name in SPECIAL_WEATHER_NAMES.values():
+        _candidate_slugs(name, "weathers")
+
 def _build_guild_role_cache(guild: discord.Guild) -> Dict[str, discord.Role]:
     cache: Dict[str, discord.Role] = {}
     for r in guild.roles:
         cache[_slug(r.name)] = r
     _ROLE_CACHE[guild.id] = cache
+    _ROLE_MISS.pop(guild.id, None)
+    _RENDER.drop_guild(guild.id)
     return cache
 
+def _invalidate_guild_roles(guild_id: int):
+    _ROLE_CACHE.pop(guild_id, None)
+    _ROLE_MISS.pop(guild_id, None)
+    _RENDER.drop_guild(guild_id)
+
+def _role_index_add(role: discord.Role):
+    cache = _ROLE_CACHE.get(role.guild.id)
+    if cache is None:
+        return
+    slug = _slug(role.name)
+    prev = cache.get(slug)
+    if prev is not None and prev.id != role.id:
+        _invalidate_guild_roles(role.guild.id)
+        return
+    cache[slug] = role
+    _ROLE_MISS.pop(role.guild.id, None)
+    _RENDER.drop_guild(role.guild.id)
+
+def _role_index_remove(role: discord.Role):
+    cache = _ROLE_CACHE.get(role.guild.id)
+    if cache is None:
+        return
+    slug = _slug(role.name)
+    prev = cache.get(slug)
+    if prev is not None and prev.id == role.id:
+        _invalidate_guild_roles(role.guild.id)
+
 def _find_role(guild: discord.Guild, display_name: str, category: str) -> Optional[discord.Role]:
     if not guild or not display_name:
         return None
-    cache = _ROLE_CACHE.get(guild.id) or _build_guild_role_cache(guild)
-    for cand in _role_candidates(display_name, category):
-        r = cache.get(_slug(cand))
-        if r:
-            return r
-    cache = _build_guild_role_cache(guild)
-    for cand in _role_candidates(display_name, category):
-        r = cache.get(_slug(cand))
+    cache = _ROLE_CACHE.get(guild.id)
+    if cache is None:
+        cache = _build_guild_role_cache(guild)
+    misses = _ROLE_MISS.get(guild.id)
+    key = (category, display_name)
+    if misses is not None and key in misses:
+        return None
+    for slug in _candidate_slugs(display_name, category):
+        r = cache.get(slug)
         if r:
             return r
+    if misses is None:
+        misses = _ROLE_MISS[guild.id] = set()
+    misses.add(key)
     return None
 
+_precompute_role_candidates()
+
 async def send_debug(obj):
     if not DEBUG_RAW or not DEBUG_CHANNEL_ID: return
     ch = await _resolve_channel(DEBUG_CHANNEL_ID)
     if not ch: return
     s = json.dumps(obj, indent=2)
     if len(s) <= 1900:
-        await _safe_send(ch, content=f"```json\n{s}\n```")
+        await _safe_send(ch, priority=PRIO_DEBUG, content=f"```json\n{s}\n```")
     else:
         fp = io.BytesIO(s.encode("utf-8"))
-        await _safe_send(ch, content="Full payload attached:", file=discord.File(fp, filename="payload.json"))
+        await _safe_send(ch, priority=PRIO_DEBUG, content="Full payload attached:", file=discord.File(fp, filename="payload.json"))
 
-def _deepcopy_json_safe(obj):
-    try:
-        return json.loads(json.dumps(obj))
-    except Exception:
-        return obj
+_snapshot_saved_at = 0.0
+_snapshot_saved_version = 0
+
+def _persist_snapshot(force: bool = False):
+    global _snapshot_saved_at, _snapshot_saved_version
+    if SNAPSHOT_PERSIST_SEC <= 0 or _SNAPSHOT.version == _snapshot_saved_version:
+        return
+    if force or time.monotonic() - _snapshot_saved_at >= SNAPSHOT_PERSIST_SEC:
+        _snapshot_saved_at, _snapshot_saved_version = time.monotonic(), _SNAPSHOT.version
+        _STATE.record("snapshot", _SNAPSHOT.view())
 
 def _update_snapshot_from_raw(raw: dict):
-    touched = False
-    for k, v in raw.items():
-        if isinstance(k, str) and k.endswith("_stock") and isinstance(v, list):
-            _state_snapshot[k] = _deepcopy_json_safe(v)
-            touched = True
-    if isinstance(raw.get("weather"), list):
-        for w in raw["weather"]:
-            if not isinstance(w, dict):
-                continue
-            key = _weather_key(w)
-            if not key:
-                continue
-            _weather_index[key] = _deepcopy_json_safe(w)
-        _state_snapshot["weather"] = list(_weather_index.values())
-        touched = True
-
-    if isinstance(raw.get("notification"), list):
-        _state_snapshot["notification"] = _deepcopy_json_safe(raw["notification"])
-        touched = True
-    if isinstance(raw.get("travelingmerchant_stock"), dict):
-        _state_snapshot["travelingmerchant_stock"] = _deepcopy_json_safe(raw["travelingmerchant_stock"])
-        touched = True
-    if touched:
-        _state_snapshot["_meta"]["updated_at"] = int(time.time())
+    if _SNAPSHOT.apply(raw):
+        _persist_snapshot()
+
+_NAME_KEYS = ("display_name", "item_id", "name")
+_QTY_KEYS  = ("quantity", "stock", "amount", "qty")
+_TS_KEYS   = ("Date_Start", "Date_Start_ISO", "ts", "start_date_unix")
+_EXTRACTORS = _BoundedDict("extractors", 256)
+_last_extractor = None
+_STOCK_KEY_CATEGORY = _BoundedDict("stock_key_category", 1024)
+
+def _extract_item_generic(it: dict) -> dict:
+    name = it.get("display_name") or it.get("item_id") or it.get("name") or "(unknown)"
+    qty  = it.get("quantity") or it.get("stock") or it.get("amount") or it.get("qty")
+    ts   = it.get("Date_Start") or it.get("Date_Start_ISO") or it.get("ts") or it.get("start_date_unix")
+    return {"name": name, "qty": qty, "ts": ts}
+
+def _first_of(it: dict, keys: tuple, default):
+    v = None
+    for k in keys:
+        v = it.get(k)
+        if v:
+            return v
+    return default or v
+
+def _list_extractor(keys: frozenset):
+    ex = _EXTRACTORS.get(keys, _BoundedDict._MISSING)
+    if ex is _BoundedDict._MISSING:
+        ex, picked, absent = None, [], set()
+        for candidates, default in ((_NAME_KEYS, "(unknown)"), (_QTY_KEYS, None), (_TS_KEYS, None)):
+            i = next((i for i, k in enumerate(candidates) if k in keys), None)
+            if i is None:
+                break
+            absent.update(candidates[:i])
+            picked.append((candidates[i], candidates[i:], default))
+        else:
+            (n, nk, nd), (q, qk, qd), (t, tk, td) = picked
+            absent = frozenset(absent)
+
+            def ex(items: list) -> List[dict]:
+                if absent and not all(map(absent.isdisjoint, items)):
+                    raise KeyError("layout")
+                return [{"name": it[n] or _first_of(it, nk, nd),
+                         "qty": it[q] or _first_of(it, qk, qd),
+                         "ts": it[t] or _first_of(it, tk, td)} for it in items]
+        _EXTRACTORS[keys] = ex
+    return ex
+
+def _extract_items(items: list, out: List[dict]):
+    global _last_extractor
+    if not items:
+        return
+    if _last_extractor is not None:
+        try:
+            out.extend(_last_extractor(items))
+            return
+        except (KeyError, TypeError):
+            pass
+    first = items[0]
+    if isinstance(first, dict):
+        ex = _list_extractor(frozenset(first))
+        if ex is not None:
+            try:
+                out.extend(ex(items))
+                _last_extractor = ex
+                return
+            except (KeyError, TypeError):
+                pass
+    out.extend([_extract_item_generic(it) for it in items])
+
+def _stock_key_category(key: str) -> Optional[str]:
+    try:
+        return _STOCK_KEY_CATEGORY[key]
+    except KeyError:
+        category = _map_cat(key[:-6].rstrip("s"))
+        category = category if category in CATEGORY_CHANNELS else None
+        _STOCK_KEY_CATEGORY[key] = category
+        return category
 
 def parse_stock_payload(raw: dict) -> Tuple[Dict[str, List[dict]], Dict[str, Any]]:
     stock_map: Dict[str, List[dict]] = {}
     extras: Dict[str, Any] = {}
     if not isinstance(raw, dict):
         return stock_map, extras
+    spent: Dict[str, float] = {}
     for key, items in raw.items():
         if isinstance(key, str) and key.endswith("_stock") and isinstance(items, list):
-            base = key[:-6]
-            base = base.rstrip("s")
-            category = _map_cat(base)
-            if category not in CATEGORY_CHANNELS:
+            t0 = time.perf_counter()
+            category = _stock_key_category(key)
+            if category is None:
                 continue
-            stock_map.setdefault(category, [])
-            for it in items:
-                name = it.get("display_name") or it.get("item_id") or it.get("name") or "(unknown)"
-                qty  = it.get("quantity") or it.get("stock") or it.get("amount") or it.get("qty")
-                ts   = it.get("Date_Start") or it.get("Date_Start_ISO") or it.get("ts") or it.get("start_date_unix")
-                stock_map[category].append({"name": name, "qty": qty, "ts": ts})
+            _extract_items(items, stock_map.setdefault(category, []))
+            spent[category] = spent.get(category, 0.0) + time.perf_counter() - t0
     tm = raw.get("travelingmerchant_stock")
     if isinstance(tm, dict):
+        t0 = time.perf_counter()
         items = tm.get("stock") or []
         extras["merchant_name"] = tm.get("merchantName") or tm.get("merchant_name")
-        category = "merchant"
-        stock_map.setdefault(category, [])
-        for it in items:
-            name = it.get("display_name") or it.get("item_id") or it.get("name") or "(unknown)"
-            qty  = it.get("quantity") or it.get("stock") or it.get("amount") or it.get("qty")
-            ts   = it.get("Date_Start") or it.get("Date_Start_ISO") or it.get("ts") or it.get("start_date_unix")
-            stock_map[category].append({"name": name, "qty": qty, "ts": ts})
+        _extract_items(items, stock_map.setdefault("merchant", []))
+        spent["merchant"] = spent.get("merchant", 0.0) + time.perf_counter() - t0
+    for category, items in stock_map.items():
+        t0 = time.perf_counter()
+        _annotate_items(category, items)
+        _METRICS.observe("gag_parse_seconds", spent.get(category, 0.0) + time.perf_counter() - t0, category=category)
     return stock_map, extras
 
 def parse_weather_payload(raw: dict) -> List[dict]:
@@ -557,98 +2221,199 @@ def _fmt_duration(sec: Optional[int]) -> str:
         return f"{m}m {s}s left"
     return f"{s}s left"
 
-def _build_text_lines(category: str, items: List[dict], title_hint: Optional[str] = None) -> str:
-    title = f"{category.capitalize()} stock"
-    if title_hint:
-        title += f" — {title_hint}"
-    header = f"**{title} ({len(items)} item{'s' if len(items)!=1 else ''})**"
+RENDER_CACHE_MAX_TABLES = int(os.getenv("RENDER_CACHE_MAX_TABLES", "512"))
+_ROLE_ITEM_CATS = ("seeds", "pets", "gears")
+
+class _RenderCache:
+    def __init__(self):
+        self.tables: Dict[Tuple[Optional[int], str], Dict[tuple, Tuple[str, Optional[discord.Role]]]] = {}
+
+    def table(self, gid: Optional[int], category: str) -> Dict[tuple, Tuple[str, Optional[discord.Role]]]:
+        return self.tables.get((gid, category)) or {}
+
+    def store(self, gid: Optional[int], category: str, lines: Dict[tuple, Tuple[str, Optional[discord.Role]]]):
+        key = (gid, category)
+        if key not in self.tables and len(self.tables) >= RENDER_CACHE_MAX_TABLES:
+            self.tables.pop(next(iter(self.tables)))
+        self.tables[key] = lines
+
+    def drop_guild(self, gid: int):
+        for key in [k for k in self.tables if k[0] == gid]:
+            del self.tables[key]
+
+_RENDER = _RenderCache()
+
+def _count_suffix(n: int) -> str:
+    return f"({n} item{'s' if n != 1 else ''})**"
+
+def _render_lines(category: str, items: List[dict], header: str, guild, footer: str = "") -> Tuple[str, List[discord.Role]]:
+    mention = bool(ROLE_MENTIONS and guild and category in _ROLE_ITEM_CATS)
+    gid = guild.id if mention else None
+    cached = _RENDER.table(gid, category)
+    fresh: Dict[tuple, Tuple[str, Optional[discord.Role]]] = {}
+    roles_to_ping: List[discord.Role] = []
     lines = [header]
-    remaining_chars = 2000 - len(header) - 1
-    shown = 0
+    remaining_chars = 2000 - len(header) - 1 - (len(footer) + 1 if footer else 0)
+    misses = 0
     for it in items:
         name = str(it.get("name", "(unknown)"))
-        qty  = it.get("qty")
-        line = f"• {name} — **{qty}**"
+        key = (name, it.get("qty"))
+        hit = cached.get(key) or fresh.get(key)
+        if hit is None:
+            role = _find_role(guild, name, category) if mention else None
+            hit = (f"• {role.mention if role else name} — **{key[1]}**", role)
+            misses += 1
+        fresh[key] = hit
+        line, role = hit
+        if role is not None:
+            roles_to_ping.append(role)
         if len(line) + 1 <= remaining_chars:
             lines.append(line)
             remaining_chars -= (len(line) + 1)
-            shown += 1
         else:
+            lines.append(f"… +{len(items) - (len(lines)-1)} more")
             break
-    if shown < len(items):
-        lines.append(f"… +{len(items)-shown} more")
-    return "\n".join(lines)
+    if footer:
+        lines.append(footer)
+    _RENDER.store(gid, category, fresh)
+    _METRICS.inc("gag_render_lines_total", len(fresh) - misses, result="hit")
+    _METRICS.inc("gag_render_lines_total", misses, result="miss")
+    return "\n".join(lines), roles_to_ping
+
+def _build_text_lines(category: str, items: List[dict], title_hint: Optional[str] = None) -> str:
+    title = f"{category.capitalize()} stock"
+    if title_hint:
+        title += f" — {title_hint}"
+    return _render_lines(category, items, f"**{title} {_count_suffix(len(items))}", None)[0]
+
+def _render_batch(category: str, items: List[dict], title_hint: Optional[str], guild, footer: str = "") -> Tuple[str, List[discord.Role]]:
+    if category != "merchant":
+        return _render_lines(category, items, f"**{category.capitalize()} stock {_count_suffix(len(items))}", guild, footer)
+    header_suffix = ""
+    merchant_role = None
+    if ROLE_MENTIONS and guild and title_hint:
+        merchant_role = _find_role(guild, title_hint, "merchant")
+        header_suffix = f" — {merchant_role.mention}" if merchant_role else f" — {title_hint}"
+    elif title_hint:
+        header_suffix = f" — {title_hint}"
+    content, roles_to_ping = _render_lines(category, items, f"**Merchant stock{header_suffix} {_count_suffix(len(items))}", guild, footer)
+    if merchant_role:
+        roles_to_ping.insert(0, merchant_role)
+    return content, roles_to_ping
+
+LIVE_BOARD = os.getenv("LIVE_BOARD", "0") == "1"
+LIVE_BOARD_CATEGORIES = {c.strip() for c in os.getenv("LIVE_BOARD_CATEGORIES", "seeds,pets,gears,cosmetics").split(",") if c.strip()}
+LIVE_BOARD_INTERVAL_SEC = float(os.getenv("LIVE_BOARD_INTERVAL_SEC", "10"))
+LIVE_BOARD_PIN = os.getenv("LIVE_BOARD_PIN", "1") == "1"
+
+class _Board:
+    __slots__ = ("message_id", "content", "roles", "edited_at")
+
+    def __init__(self):
+        self.message_id = 0
+        self.content = ""
+        self.roles: set = set()
+        self.edited_at = 0.0
 
-async def send_batch_text(category: str, items: List[dict], title_hint: Optional[str] = None):
+_BOARDS: Dict[Tuple[int, str], _Board] = {}
+
+def _uses_board(category: str) -> bool:
+    return LIVE_BOARD and category in LIVE_BOARD_CATEGORIES
+
+def _persist_board(cid: int, category: str, board: _Board):
+    _STATE.record(f"board:{cid}:{category}", {"id": board.message_id, "roles": sorted(board.roles)})
+
+async def _board_write(ch, category: str, board: _Board):
+    content = board.content
+    if board.message_id:
+        try:
+            await ch.get_partial_message(board.message_id).edit(content=content, allowed_mentions=AllowedMentions.none())
+            return
+        except discord.NotFound:
+            _log("board", f"message {board.message_id} in channel {ch.id} is gone; posting a new board", level="warning")
+            board.message_id = 0
+    msg = await ch.send(content=content, allowed_mentions=AllowedMentions.none())
+    board.message_id = msg.id
+    _persist_board(ch.id, category, board)
+    if LIVE_BOARD_PIN:
+        try:
+            await msg.pin()
+        except discord.HTTPException as e:
+            _log("board", f"cannot pin in channel {ch.id}: {e}", level="warning")
+
+async def _board_flush(ch, category: str, board: _Board):
+    board.edited_at = time.monotonic()
+    await _safe_send(ch, coalesce=f"board:{category}", op=lambda: _board_write(ch, category, board))
+
+async def _board_update(ch, category: str, content: str, roles: List[discord.Role], outbox: Optional[_FrameOutbox] = None):
+    key = (ch.id, category)
+    board = _BOARDS.get(key)
+    if board is None:
+        board = _BOARDS[key] = _Board()
+    role_ids = {r.id for r in roles}
+    fresh = list({r.id: r for r in roles if r.id not in board.roles}.values())
+    if role_ids != board.roles:
+        board.roles = role_ids
+        _persist_board(ch.id, category, board)
+    board.content = content
+    if not _TIMERS.pending(("board", key)):
+        delay = board.edited_at + LIVE_BOARD_INTERVAL_SEC - time.monotonic()
+        _TIMERS.call_later(("board", key), max(0.0, delay), lambda: _board_flush(ch, category, board))
+    if fresh:
+        prio = PRIO_URGENT if category == "merchant" else PRIO_STOCK
+        await _safe_send(ch, priority=prio, outbox=outbox, content=f"**New in {category}:** " + " ".join(r.mention for r in fresh),
+                         allowed_mentions=AllowedMentions(everyone=False, users=False, roles=fresh))
+
+async def send_batch_text(category: str, items: List[dict], title_hint: Optional[str] = None, outbox: Optional[_FrameOutbox] = None):
     if category == "merchant" and not items:
         return None
-    cid = CATEGORY_CHANNELS.get(category, 0)
-    ch = await _resolve_channel(cid)
-    if not ch:
-        print(f"[warn] no channel for category={category} (ID={cid})")
+    channels = await _resolve_channels(category)
+    if not channels:
+        _log("send", f"no channel for category={category} (IDs={CATEGORY_FANOUT.get(category) or []})", level="warning", key=f"no_channel:{category}")
         return
-    guild = ch.guild if hasattr(ch, "guild") else None
     if category in ("seeds", "pets", "gears"):
         items = sort_items(category, items)
     if category == "cosmetics":
         global _last_cosmetics_sig
         sig = _signature_for_cosmetics(items)
+        _dedupe("cosmetics", _last_cosmetics_sig == sig)
         if _last_cosmetics_sig == sig:
             return None
         content = _build_text_lines(category, items, title_hint=title_hint)
-        msg = await _safe_send(ch, content=content)
+        for ch in channels:
+            if _uses_board(category):
+                await _board_update(ch, category, content, [], outbox)
+            else:
+                await _safe_send(ch, coalesce="batch:cosmetics", outbox=outbox, content=content)
         _last_cosmetics_sig = sig
-        return msg
-    batch_signature = json.dumps([{"n": it.get("name"), "q": it.get("qty")} for it in items], sort_keys=False)
-    if title_hint:
-        batch_signature += f"|{title_hint}"
-    h = hashlib.sha256(batch_signature.encode()).hexdigest()
+        _STATE.record("cosmetics", sig)
+        return None
+    h = _batch_signature(items, title_hint)
+    _dedupe("batch", _last_batch_hash.get(category) == h)
     if _last_batch_hash.get(category) == h:
         return
     _last_batch_hash[category] = h
-    roles_to_ping: List[discord.Role] = []
-    if category == "merchant":
-        header_title = "Merchant stock"
-        header_suffix = ""
-        if ROLE_MENTIONS and guild and title_hint:
-            r = _find_role(guild, title_hint, "merchant")
-            if r:
-                header_suffix = f" — {r.mention}"
-                roles_to_ping.append(r)
-            elif title_hint:
-                header_suffix = f" — {title_hint}"
-        elif title_hint:
-            header_suffix = f" — {title_hint}"
-        header = f"**{header_title}{header_suffix} ({len(items)} item{'s' if len(items)!=1 else ''})**"
-    else:
-        header = f"**{category.capitalize()} stock ({len(items)} item{'s' if len(items)!=1 else ''})**"
-    lines = [header]
-    remaining_chars = 2000 - len(header) - 1
-    for it in items:
-        name = str(it.get("name", "(unknown)"))
-        qty  = it.get("qty")
-        label = name
-        if ROLE_MENTIONS and guild and category in ("seeds", "pets", "gears"):
-            r = _find_role(guild, name, category)
-            if r:
-                label = r.mention
-                roles_to_ping.append(r)
-        line = f"• {label} — **{qty}**"
-        if len(line) + 1 <= remaining_chars:
-            lines.append(line)
-            remaining_chars -= (len(line) + 1)
+    _STATE.record(f"batch:{category}", h)
+    prio = PRIO_URGENT if category == "merchant" else PRIO_STOCK
+    rendered: Dict[Optional[int], Tuple[str, AllowedMentions, List[discord.Role]]] = {}
+    footer = _predict_line(category)
+    for ch in channels:
+        guild = ch.guild if hasattr(ch, "guild") else None
+        gid = guild.id if (guild and ROLE_MENTIONS) else None
+        out = rendered.get(gid)
+        if out is None:
+            content, roles_to_ping = _render_batch(category, items, title_hint, guild if gid else None, footer)
+            am = AllowedMentions(everyone=False, users=False, roles=list(set(roles_to_ping)))
+            out = rendered[gid] = (content, am, roles_to_ping)
+        if _uses_board(category):
+            await _board_update(ch, category, out[0], out[2], outbox)
         else:
-            lines.append(f"… +{len(items) - (len(lines)-1)} more")
-            break
-    content = "\n".join(lines)
-    am = AllowedMentions(everyone=False, users=False, roles=list(set(roles_to_ping)))
-    await _safe_send(ch, content=content, allowed_mentions=am)
+            await _safe_send(ch, priority=prio, coalesce=f"batch:{category}", outbox=outbox, content=out[0], allowed_mentions=out[1])
 
 async def send_absent_notice(category: str, title_hint: Optional[str] = None):
-    cid = CATEGORY_CHANNELS.get(category, 0)
-    ch = await _resolve_channel(cid)
-    if not ch:
-        print(f"[warn] no channel for category={category} (ID={cid})")
+    channels = await _resolve_channels(category)
+    if not channels:
+        _log("send", f"no channel for category={category} (IDs={CATEGORY_FANOUT.get(category) or []})", level="warning", key=f"no_channel:{category}")
         return
     if category == "merchant":
         msg = "**Traveling Merchant** — none right now."
@@ -658,36 +2423,13 @@ async def send_absent_notice(category: str, title_hint: Optional[str] = None):
         msg = "**Active Weathers** — none."
     else:
         msg = f"**{category.capitalize()}** — no items."
-    await _safe_send(ch, content=msg)
+    for ch in channels:
+        if _uses_board(category):
+            await _board_update(ch, category, msg, [])
+        else:
+            await _safe_send(ch, priority=PRIO_URGENT if category in ("merchant", "weathers") else PRIO_STOCK, content=msg)
 
-async def send_weather_embeds(active_weathers: List[dict]):
-    if not active_weathers:
-        return
-    cid = CATEGORY_CHANNELS.get("weathers", 0)
-    ch = await _resolve_channel(cid)
-    if not ch:
-        print(f"[warn] no channel for category=weathers (ID={cid})")
-        return
-    now = int(time.time())
-    guild = ch.guild if hasattr(ch, "guild") else None
-    current_raws = {w.get("raw", w["name"]) for w in active_weathers}
-    for k in list(_weather_suppress_until.keys()):
-        if k not in current_raws and _weather_suppress_until[k] <= now:
-            _weather_suppress_until.pop(k, None)
-    to_post: List[dict] = []
-    for w in active_weathers:
-        raw_id = w.get("raw", w["name"])
-        until = _weather_suppress_until.get(raw_id, 0)
-        if now >= int(until):
-            to_post.append(w)
-    if not to_post:
-        return
-    sig = json.dumps([{"n": w.get("raw", w["name"]), "e": w.get("end", 0)} for w in to_post], sort_keys=True)
-    global _last_weather_hash
-    h = hashlib.sha256(sig.encode()).hexdigest()
-    if _last_weather_hash == h:
-        return
-    _last_weather_hash = h
+def _render_weather(to_post: List[dict], guild) -> Tuple[str, List[discord.Role]]:
     roles_to_ping: List[discord.Role] = []
     lines: List[str] = []
     remaining = 2000
@@ -706,7 +2448,7 @@ async def send_weather_embeds(active_weathers: List[dict]):
         role_to_ping = None
         if ROLE_MENTIONS and guild:
             raw_id = w.get("raw", w["name"])
-            if raw_id in ADMIN_ABUSE_WEATHERS:
+            if _weather_norm(raw_id) in ADMIN_ABUSE_WEATHERS:
                 role_to_ping = _find_role(guild, ADMIN_ABUSE_ROLE_NAME, "weathers")
             else:
                 role_to_ping = _find_role(guild, w["name"], "weathers")
@@ -716,6 +2458,33 @@ async def send_weather_embeds(active_weathers: List[dict]):
         if not add_line(label):
             break
     content = "\n".join(lines) if lines else "**Active Weathers**"
+    return content, roles_to_ping
+
+async def send_weather_embeds(active_weathers: List[dict], outbox: Optional[_FrameOutbox] = None):
+    if not active_weathers:
+        return
+    channels = await _resolve_channels("weathers")
+    if not channels:
+        _log("send", f"no channel for category=weathers (IDs={CATEGORY_FANOUT.get('weathers') or []})", level="warning", key="no_channel:weathers")
+        return
+    now = int(time.time())
+    to_post: List[dict] = []
+    for w in active_weathers:
+        raw_id = w.get("raw", w["name"])
+        until = _weather_suppress_until.get(raw_id, 0)
+        if now >= int(until):
+            to_post.append(w)
+        else:
+            _dedupe("weather_suppress", True)
+    if not to_post:
+        return
+    global _last_weather_hash
+    h = tuple((w.get("raw", w["name"]), w.get("end", 0)) for w in to_post)
+    _dedupe("weather", _last_weather_hash == h)
+    if _last_weather_hash == h:
+        return
+    _last_weather_hash = h
+    _STATE.record("weather_hash", h)
     embeds: List[discord.Embed] = []
     for w in to_post[:10]:
         desc = f"{w['name']} — ends <t:{int(w['end'])}:R>" if w.get("end") else f"{w['name']} — active"
@@ -726,8 +2495,16 @@ async def send_weather_embeds(active_weathers: List[dict]):
             except Exception:
                 pass
         embeds.append(e)
-    am = AllowedMentions(everyone=False, users=False, roles=list(set(roles_to_ping)))
-    await _safe_send(ch, content=content, embeds=embeds, allowed_mentions=am)
+    rendered: Dict[Optional[int], Tuple[str, AllowedMentions]] = {}
+    for ch in channels:
+        guild = ch.guild if hasattr(ch, "guild") else None
+        gid = guild.id if (guild and ROLE_MENTIONS) else None
+        out = rendered.get(gid)
+        if out is None:
+            content, roles_to_ping = _render_weather(to_post, guild if gid else None)
+            am = AllowedMentions(everyone=False, users=False, roles=list(set(roles_to_ping)))
+            out = rendered[gid] = (content, am)
+        await _safe_send(ch, priority=PRIO_URGENT, outbox=outbox, content=out[0], embeds=embeds, allowed_mentions=out[1])
     for w in to_post:
         raw_id = w.get("raw", w["name"])
         end_ts = None
@@ -735,182 +2512,658 @@ async def send_weather_embeds(active_weathers: List[dict]):
             end_ts = int(w.get("end") or 0)
         except Exception:
             end_ts = 0
-        suppress_until = end_ts if end_ts and end_ts > now else now + DEFAULT_WEATHER_SUPPRESS_FALLBACK
-        _weather_suppress_until[raw_id] = suppress_until
+        _suppress_weather(raw_id, end_ts if end_ts and end_ts > now else now + DEFAULT_WEATHER_SUPPRESS_FALLBACK)
+    _STATE.record("weather_suppress", dict(_weather_suppress_until))
 
 async def send_update(category: str, data: dict):
-    cid = CATEGORY_CHANNELS.get(category, 0)
-    ch = await _resolve_channel(cid)
-    if not ch:
-        print(f"[warn] no channel for category={category} (ID={cid})")
+    channels = await _resolve_channels(category)
+    if not channels:
+        _log("send", f"no channel for category={category} (IDs={CATEGORY_FANOUT.get(category) or []})", level="warning", key=f"no_channel:{category}")
         return
     key = (category, str(data.get("item", "?")))
-    h = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    h = tuple(sorted(data.items()))
+    _dedupe("item", _last_item_hash.get(key) == h)
     if _last_item_hash.get(key) == h:
         return
     _last_item_hash[key] = h
     line = f"**{category.capitalize()} update:** {data.get('item','(unknown)')} — **{data.get('stock','?')}**"
-    await _safe_send(ch, content=line)
+    for ch in channels:
+        await _safe_send(ch, content=line)
+
+FRAME_BUFFER_SLOTS = int(os.getenv("FRAME_BUFFER_SLOTS", "64"))
+
+class _FrameBuffer:
+    def __init__(self, max_slots: int):
+        self.max_slots = max(1, max_slots)
+        self.slots: Dict[str, Any] = {}
+        self.weather: Optional[Dict[str, dict]] = None
+        self.event = asyncio.Event()
+        self.busy = False
+        self.stats: Dict[str, int] = {"frames": 0, "superseded": 0, "overflow": 0, "batches": 0}
+
+    def __len__(self) -> int:
+        return len(self.slots) + (self.weather is not None)
+
+    def drained(self) -> bool:
+        return not self.busy and not len(self)
+
+    def put(self, raw: dict):
+        self.stats["frames"] += 1
+        full = len(self) >= self.max_slots
+        for k, v in raw.items():
+            if k == "weather" and isinstance(v, list):
+                if self.weather is None:
+                    if full:
+                        self.stats["overflow"] += 1
+                        continue
+                    self.weather = {}
+                else:
+                    self.stats["superseded"] += 1
+                for w in v:
+                    if not isinstance(w, dict):
+                        continue
+                    wk = _weather_key(w) or "(unknown)"
+                    if w.get("active"):
+                        self.weather[wk] = w
+                    else:
+                        self.weather.pop(wk, None)
+            elif isinstance(k, str) and k.endswith("_stock"):
+                if k in self.slots:
+                    self.stats["superseded"] += 1
+                elif full:
+                    self.stats["overflow"] += 1
+                    continue
+                self.slots[k] = v
+        if len(self):
+            self.event.set()
+
+    def take(self) -> Optional[dict]:
+        self.event.clear()
+        if not len(self):
+            return None
+        raw, self.slots = self.slots, {}
+        if self.weather is not None:
+            raw["weather"] = list(self.weather.values())
+            self.weather = None
+        self.stats["batches"] += 1
+        return raw
+
+_FRAME_BUF = _FrameBuffer(FRAME_BUFFER_SLOTS)
+_WS_STATS: Dict[str, int] = {"frames": 0, "processed": 0}
+HEALTH_STALE_SEC = int(os.getenv("HEALTH_STALE_SEC", "600"))
+_HEALTH: Dict[str, Any] = {"started_at": time.time(), "last_frame_at": 0.0, "active": False}
+
+def _collect_runtime_metrics():
+    yield "gag_send_queue_depth", {}, sum(len(lane) for lane in _LANES.values())
+    yield "gag_send_coalesced_total", {}, _SEND_STATS["coalesced"]
+    yield "gag_frame_buffer_pending", {}, len(_FRAME_BUF)
+    yield "gag_timers_pending", {}, len(_TIMERS)
+    for c in _CACHES:
+        yield "gag_cache_entries", {"cache": c.name}, len(c)
+        for reason, n in c.evicted.items():
+            yield "gag_cache_evictions_total", {"cache": c.name, "reason": reason}, n
+    for k, v in _DM.stats.items():
+        yield "gag_dm_alerts_total", {"result": k}, v
+    yield "gag_dm_subscriptions", {}, sum(len(v) for v in _DM.by_user.values())
+    yield "gag_timers_fired_total", {}, _TIMERS.fired
+    for k, v in _LOG.stats.items():
+        yield "gag_log_lines_total", {"result": k}, v
+    for k, v in _FRAME_BUF.stats.items():
+        yield "gag_frame_buffer_total", {"event": k}, v
+    last = _HEALTH["last_frame_at"]
+    if last:
+        yield "gag_ws_last_frame_age_seconds", {}, max(0.0, time.time() - last)
+
+_METRICS.collectors.append(_collect_runtime_metrics)
+
+def _has_stock(raw) -> bool:
+    return isinstance(raw, dict) and (any(isinstance(v, list) and isinstance(k, str) and k.endswith("_stock") for k, v in raw.items())
+        or isinstance(raw.get("travelingmerchant_stock"), dict))
+
+def _record_ingest(raw: dict):
+    if _has_stock(raw):
+        try:
+            stock_map, _ = parse_stock_payload(raw)
+            _record_stock({cat: _StockSnapshot.from_items(items) for cat, items in stock_map.items()})
+        except Exception as e:
+            _log("history", f"cannot record stock: {e}", level="error")
+    if isinstance(raw.get("weather"), list):
+        try:
+            _record_weathers(parse_weather_payload(raw))
+        except Exception as e:
+            _log("history", f"cannot record weather: {e}", level="error")
+    raw["_restock"] = _PREDICT.cadence()
+
+async def _dispatch_frame(raw: dict):
+    outbox = _FrameOutbox() if SEND_MERGE else None
+    try:
+        await _dispatch_sections(raw, outbox)
+    finally:
+        if outbox is not None:
+            await outbox.flush()
+
+async def _dispatch_sections(raw: dict, outbox: Optional[_FrameOutbox]):
+    global _last_merchant_name, _last_merchant_sig, _last_merchant_at, _DEBUG_SENT_ONCE
+    if DEBUG_RAW and not _DEBUG_SENT_ONCE:
+        try:
+            await send_debug(raw)
+            _DEBUG_SENT_ONCE = True
+        except Exception as e:
+            _log("debug", f"send_debug failed: {e}", level="error")
+    if _LOG.enabled("ws", "debug") and isinstance(raw, dict):
+        _log("ws", "frame", level="debug", sample=LOG_DEBUG_SAMPLE, keys=sorted(k for k in raw if isinstance(k, str)))
+    processed_any = False
+    if _has_stock(raw):
+        try:
+            stock_map, extras = parse_stock_payload(raw)
+        except Exception as e:
+            _log("ws", f"parse_stock_payload error: {e}", level="error")
+            stock_map, extras = {}, {}
+        merchant_items = stock_map.get("merchant", [])
+        curr_name = (extras.get("merchant_name") or "").strip() if isinstance(extras, dict) else ""
+        if curr_name:
+            if merchant_items:
+                try:
+                    curr_sig = _merchant_signature(merchant_items)
+                except Exception as e:
+                    _log("ws", f"merchant sig error: {e}", level="error")
+                    curr_sig = None
+            announce = False
+            if _last_merchant_name != curr_name:
+                announce = True
+            elif not _TIMERS.pending("merchant") and curr_sig and _last_merchant_sig != curr_sig:
+                announce = True
+            _dedupe("merchant_suppress", not announce)
+            if announce:
+                try:
+                    await send_batch_text("merchant", merchant_items, title_hint=curr_name, outbox=outbox)
+                    _last_merchant_name = curr_name
+                    _last_merchant_sig  = curr_sig
+                    _last_merchant_at   = time.time()
+                    _suppress_merchant(_last_merchant_at)
+                    _persist_merchant()
+                except Exception as e:
+                    _log("ws", f"merchant send error: {e}", level="error")
+            processed_any = True
+        elif "travelingmerchant_stock" in raw:
+            if _last_merchant_sig is not None or _last_merchant_at:
+                _last_merchant_sig = None
+                _last_merchant_at  = 0.0
+                _suppress_merchant(0.0)
+                _persist_merchant()
+            processed_any = True
+
+        snaps = {cat: _StockSnapshot.from_items(items) for cat, items in stock_map.items()}
+        if _RECORD_HISTORY:
+            _record_stock(snaps)
+        if DM_ALERTS:
+            for cat, snap in snaps.items():
+                _DM.on_stock(cat, snap)
+        for cat, items in stock_map.items():
+            if cat == "merchant":
+                continue
+            if cat not in CATEGORY_CHANNELS or not items:
+                continue
+            try:
+                t0 = time.perf_counter()
+                if cat in ("seeds", "pets", "gears"):
+                    curr_map = snaps[cat]
+                    changed = curr_map.diff(_last_announced_snapshot.get(cat, _EMPTY_SNAPSHOT))
+                    if len(changed) == 1:
+                        _start_or_reset_debounce(cat, items)
+                    else:
+                        if _single_change_debounce.get(cat):
+                            _cancel_debounce(cat)
+                        await send_batch_text(cat, items, outbox=outbox)
+                        _last_announced_snapshot[cat] = curr_map
+                        _STATE.record(f"announced:{cat}", curr_map.pairs)
+                else:
+                    await send_batch_text(cat, items, outbox=outbox)
+                _METRICS.observe("gag_dispatch_seconds", time.perf_counter() - t0, category=cat)
+                processed_any = True
+            except Exception as e:
+                _log("ws", f"send_batch_text({cat}) error: {e}", level="error")
+    if isinstance(raw, dict) and isinstance(raw.get("weather"), list):
+        try:
+            t0 = time.perf_counter()
+            active_weathers = parse_weather_payload(raw)
+            _METRICS.observe("gag_parse_seconds", time.perf_counter() - t0, category="weathers")
+        except Exception as e:
+            _log("ws", f"parse_weather_payload error: {e}", level="error")
+            active_weathers = []
+        if _RECORD_HISTORY:
+            _record_weathers(active_weathers)
+        if active_weathers:
+            try:
+                t0 = time.perf_counter()
+                await send_weather_embeds(active_weathers, outbox=outbox)
+                _METRICS.observe("gag_dispatch_seconds", time.perf_counter() - t0, category="weathers")
+            except Exception as e:
+                _log("ws", f"send_weather_embeds error: {e}", level="error")
+        processed_any = True
+    _WS_STATS["processed"] += 1
+
+async def _frame_dispatcher(handler):
+    while True:
+        await _FRAME_BUF.event.wait()
+        raw = _FRAME_BUF.take()
+        if raw is None:
+            continue
+        _FRAME_BUF.busy = True
+        try:
+            await handler(raw)
+        except Exception as e:
+            _log("ws", f"dispatch error: {e}", level="error")
+        finally:
+            _FRAME_BUF.busy = False
+
+class _UpstreamSection:
+    __slots__ = ("forwarded", "caught_up")
+
+    def __init__(self):
+        self.forwarded: List[Tuple[Any, float]] = []
+        self.caught_up: set = set()
+
+class _UpstreamMerger:
+    def __init__(self, window: float):
+        self.window = window
+        self.sections: Dict[str, _UpstreamSection] = {}
+
+    def _fresh(self, section: str, value, source: str, now: float) -> bool:
+        sec = self.sections.get(section)
+        if sec is None:
+            sec = self.sections[section] = _UpstreamSection()
+        fwd = sec.forwarded
+        if fwd and fwd[-1][0] == value:
+            if source not in sec.caught_up:
+                sec.caught_up.add(source)
+                _METRICS.observe("gag_upstream_lag_seconds", now - fwd[-1][1], source=source)
+            _METRICS.inc("gag_upstream_frames_total", source=source, result="duplicate")
+            return False
+        if source not in sec.caught_up and any(v == value and now - at <= self.window for v, at in fwd[:-1]):
+            _METRICS.inc("gag_upstream_frames_total", source=source, result="stale")
+            return False
+        fwd.append((value, now))
+        cutoff = now - self.window
+        while len(fwd) > 1 and (fwd[0][1] < cutoff or len(fwd) > 8):
+            fwd.pop(0)
+        sec.caught_up = {source}
+        _METRICS.inc("gag_upstream_frames_total", source=source, result="new")
+        return True
+
+    def accept(self, source: str, raw: dict) -> Optional[dict]:
+        now = time.monotonic()
+        out: dict = {}
+        for k, v in raw.items():
+            if k == "weather" and isinstance(v, list):
+                fresh = [isinstance(w, dict) and self._fresh(f"weather:{_weather_key(w)}", w, source, now) for w in v]
+                if any(fresh):
+                    out["weather"] = v
+            elif self._fresh(str(k), v, source, now):
+                out[k] = v
+        return out or None
+
+def _upstream_sources() -> List[Tuple[str, str, str]]:
+    sources = [("ws", u.strip()) for u in (EXTERNAL_WS_URL or "").split(",") if u.strip()]
+    sources += [("http", u.strip()) for u in EXTERNAL_HTTP_URLS.split(",") if u.strip()]
+    return [(f"{kind}{i}", kind, u) for i, (kind, u) in enumerate(sources)]
+
+def _ingest(source: str, raw, merger: Optional[_UpstreamMerger]):
+    global _last_raw_payload
+    _WS_STATS["frames"] += 1
+    _HEALTH["last_frame_at"] = time.time()
+    if not isinstance(raw, dict):
+        return
+    if merger is not None:
+        raw = merger.accept(source, raw)
+        if raw is None:
+            return
+    if DEBUG_CAPTURE_PAYLOAD:
+        _last_raw_payload = raw
+        try:
+            _update_snapshot_from_raw(raw)
+        except Exception as e:
+            _log("ws", f"snapshot update error: {e}", level="error")
+    _FRAME_BUF.put(raw)
 
-async def ws_consumer():
-    global _last_merchant_name, _last_merchant_sig, _last_merchant_at
-    while not EXTERNAL_WS_URL:
-        print("[ws] EXTERNAL_WS_URL not set; retrying in 30s")
+async def ws_consumer(url: Optional[str] = None, handler=None):
+    sources = [("ws0", "ws", url)] if url else _upstream_sources()
+    while not sources:
+        _log("ws", "EXTERNAL_WS_URL / EXTERNAL_HTTP_URLS not set; retrying in 30s", level="warning")
         await asyncio.sleep(30)
         globals()["EXTERNAL_WS_URL"] = os.getenv("EXTERNAL_WS_URL")
+        globals()["EXTERNAL_HTTP_URLS"] = os.getenv("EXTERNAL_HTTP_URLS", "")
+        sources = _upstream_sources()
     headers = {}
     if WS_HEADERS_JSON.strip():
         try:
             headers = json.loads(WS_HEADERS_JSON)
         except Exception as e:
-            print(f"[ws] bad WS_HEADERS_JSON: {e}")
+            _log("ws", f"bad WS_HEADERS_JSON: {e}", level="warning")
     subscribe = None
     if WS_SUBSCRIBE_JSON.strip():
         try:
             subscribe = json.loads(WS_SUBSCRIBE_JSON)
         except Exception as e:
-            print(f"[ws] bad WS_SUBSCRIBE_JSON: {e}")
-    backoff = 1
-    async with ClientSession() as session:
-        while not bot.is_closed():
-            try:
-                print(f"[ws] connecting to {EXTERNAL_WS_URL}")
-                async with session.ws_connect(EXTERNAL_WS_URL, heartbeat=PING_EVERY, headers=headers) as ws:
-                    print("[ws] connected")
-                    backoff = 1
-                    if subscribe:
+            _log("ws", f"bad WS_SUBSCRIBE_JSON: {e}", level="warning")
+    merger = _UpstreamMerger(UPSTREAM_DEDUPE_WINDOW_SEC) if len(sources) > 1 else None
+    if merger:
+        _log("ws", f"merging {len(sources)} upstreams: {', '.join(f'{n}={u}' for n, _, u in sources)}")
+    dispatcher = asyncio.create_task(_frame_dispatcher(handler or _dispatch_frame))
+    try:
+        async with ClientSession() as session:
+            await asyncio.gather(*(
+                _ws_read_loop(session, name, u, headers, subscribe, merger) if kind == "ws"
+                else _http_poll_loop(session, name, u, headers, merger)
+                for name, kind, u in sources))
+    finally:
+        dispatcher.cancel()
+
+async def _ws_backoff(delay: float, source: str = "ws0"):
+    _METRICS.set("gag_ws_backoff_seconds", delay, source=source)
+    await asyncio.sleep(delay)
+    _METRICS.set("gag_ws_backoff_seconds", 0, source=source)
+
+class _Backoff:
+    __slots__ = ("base", "cap", "fast", "prev", "failures")
+
+    def __init__(self, base: float = WS_BACKOFF_BASE_SEC, cap: float = WS_BACKOFF_MAX_SEC, fast: float = WS_FAST_RECONNECT_SEC):
+        self.base = base
+        self.cap = cap
+        self.fast = fast
+        self.prev = base
+        self.failures = 0
+
+    def next(self) -> float:
+        self.failures += 1
+        if self.failures == 1:
+            return self.fast
+        self.prev = min(self.cap, random.uniform(self.base, self.prev * 3))
+        return self.prev
+
+    def reset(self):
+        self.prev = self.base
+        self.failures = 0
+
+class _Stalled(Exception):
+    pass
+
+def _stall_timeout() -> float:
+    if WS_STALL_FACTOR <= 0:
+        return 0.0
+    learned = [c.interval for c in _PREDICT.cats.values() if c.restocks >= 2 and c.interval]
+    cadence = min(learned) if learned else WS_RESTOCK_CADENCE_SEC
+    return max(WS_STALL_MIN_SEC, WS_STALL_FACTOR * cadence)
+
+async def _ws_subscribe(ws, source: str, subscribe):
+    frames = subscribe if isinstance(subscribe, list) and all(isinstance(f, dict) for f in subscribe) else [subscribe]
+    for frame in frames:
+        await ws.send_json(frame)
+    _log("ws", f"{source} replayed {len(frames)} subscribe frame(s)")
+
+async def _ws_read_loop(session: ClientSession, source: str, url: str, headers: dict, subscribe, merger: Optional[_UpstreamMerger] = None):
+    backoff = _Backoff()
+    lost_at: Optional[float] = None
+    while not bot.is_closed():
+        reason = "closed"
+        try:
+            _log("ws", f"{source} connecting to {url}")
+            t0 = time.monotonic()
+            async with session.ws_connect(url, heartbeat=PING_EVERY, headers=headers) as ws:
+                if subscribe:
+                    await _ws_subscribe(ws, source, subscribe)
+                _METRICS.observe("gag_ws_connect_seconds", time.monotonic() - t0, source=source)
+                _log("ws", f"{source} connected")
+                _METRICS.set("gag_ws_connected", 1, source=source)
+                last_data = time.monotonic()
+                while True:
+                    stall = _stall_timeout()
+                    try:
+                        msg = await ws.receive(timeout=(last_data + stall - time.monotonic()) if stall else None)
+                    except asyncio.TimeoutError:
+                        raise _Stalled(f"no data frame for {time.monotonic() - last_data:.0f}s")
+                    _METRICS.inc("gag_ws_frames_received_total", type=msg.type.name.lower())
+                    if msg.type == WSMsgType.TEXT:
+                        last_data = time.monotonic()
+                        if lost_at is not None:
+                            _METRICS.observe("gag_ws_recover_seconds", last_data - lost_at, source=source)
+                            lost_at = None
+                        backoff.reset()
                         try:
-                            await ws.send_json(subscribe)
-                            print("[ws] sent subscribe frame")
+                            raw = _json_loads(msg.data)
+                            _METRICS.inc("gag_ws_frames_decoded_total")
+                        except ValueError:
+                            _METRICS.inc("gag_ws_frames_failed_total", reason="bad_json")
+                            _log("ws", f"bad json :: {str(msg.data)[:200]}", level="warning", key=f"bad_json:{source}")
+                            continue
                         except Exception as e:
-                            print(f"[ws] subscribe error: {e}")
-                    async for msg in ws:
-                        if msg.type == WSMsgType.TEXT:
-                            try:
-                                raw = json.loads(msg.data)
-                                global _last_raw_payload
-                                if DEBUG_CAPTURE_PAYLOAD:
-                                    _last_raw_payload = raw
-                                    try:
-                                        if isinstance(raw, dict):
-                                            _update_snapshot_from_raw(raw)
-                                    except Exception as e:
-                                        print(f"[ws] snapshot update error: {e}")
-                            except json.JSONDecodeError:
-                                print(f"[ws] bad json :: {str(msg.data)[:200]}")
-                                continue
-                            except Exception as e:
-                                print(f"[ws] unexpected json error: {e}")
-                                continue
-                            global _DEBUG_SENT_ONCE
-                            if DEBUG_RAW and not _DEBUG_SENT_ONCE:
-                                try:
-                                    await send_debug(raw)
-                                    _DEBUG_SENT_ONCE = True
-                                except Exception as e:
-                                    print(f"[debug] send_debug failed: {e}")
-                            processed_any = False
-                            if isinstance(raw, dict) and (any(isinstance(v, list) and isinstance(k, str) and k.endswith("_stock") for k, v in raw.items())
-                                or isinstance(raw.get("travelingmerchant_stock"), dict)):
-                                try:
-                                    stock_map, extras = parse_stock_payload(raw)
-                                except Exception as e:
-                                    print(f"[ws] parse_stock_payload error: {e}")
-                                    stock_map, extras = {}, {}
-                                merchant_items = stock_map.get("merchant", [])
-                                curr_name = (extras.get("merchant_name") or "").strip() if isinstance(extras, dict) else ""
-                                if curr_name:
-                                    if merchant_items:
-                                        try:
-                                            curr_sig = _merchant_signature(merchant_items)
-                                        except Exception as e:
-                                            print(f"[ws] merchant sig error: {e}")
-                                            curr_sig = None
-                                    now = time.time()
-                                    announce = False
-                                    if _last_merchant_name != curr_name:
-                                        announce = True
-                                    else:
-                                        if (_last_merchant_at == 0.0) or (now - _last_merchant_at >= MERCHANT_SUPPRESS_MINUTES * 60):
-                                            if curr_sig and (_last_merchant_sig != curr_sig):
-                                                announce = True
-                                    if announce:
-                                        try:
-                                            await send_batch_text("merchant", merchant_items, title_hint=curr_name)
-                                            _last_merchant_name = curr_name
-                                            _last_merchant_sig  = curr_sig
-                                            _last_merchant_at   = now
-                                        except Exception as e:
-                                            print(f"[ws] merchant send error: {e}")
-                                    processed_any = True
-                                else:
-                                    _last_merchant_sig = None
-                                    _last_merchant_at  = 0.0
-                                    processed_any = True
-
-                                for cat, items in stock_map.items():
-                                    if cat == "merchant":
-                                        continue
-                                    if cat not in CATEGORY_CHANNELS or not items:
-                                        continue
-                                    try:
-                                        if cat in ("seeds", "pets", "gears"):
-                                            curr_map = _normalize_items(items)
-                                            prev_map = _last_announced_snapshot.get(cat, {})
-                                            changed = _changed_item_names(prev_map, curr_map)
-                                            if len(changed) == 1:
-                                                _start_or_reset_debounce(cat, items)
-                                            else:
-                                                if _single_change_debounce.get(cat):
-                                                    _cancel_debounce(cat)
-                                                await send_batch_text(cat, items)
-                                                _last_announced_snapshot[cat] = curr_map
-                                        else:
-                                            await send_batch_text(cat, items)
-                                        processed_any = True
-                                    except Exception as e:
-                                        print(f"[ws] send_batch_text({cat}) error: {e}")
-                            if isinstance(raw, dict) and isinstance(raw.get("weather"), list):
-                                try:
-                                    active_weathers = parse_weather_payload(raw)
-                                except Exception as e:
-                                    print(f"[ws] parse_weather_payload error: {e}")
-                                    active_weathers = []
-                                if active_weathers:
-                                    try:
-                                        await send_weather_embeds(active_weathers)
-                                    except Exception as e:
-                                        print(f"[ws] send_weather_embeds error: {e}")
-                                processed_any = True
-                        elif msg.type == WSMsgType.PING:
-                            try:
-                                await ws.pong()
-                            except Exception:
-                                pass
-                        elif msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSED, WSMsgType.ERROR):
-                            raise RuntimeError(f"ws closed: {msg.type}")
-                        else:
+                            _METRICS.inc("gag_ws_frames_failed_total", reason="error")
+                            _log("ws", f"unexpected json error: {e}", level="error")
                             continue
-                print("[ws] disconnected; reconnecting")
-            except (ClientConnectorError, WSServerHandshakeError) as e:
-                print(f"[ws] connect error: {e}; retrying in {backoff}s")
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 60)
-            except Exception as e:
-                print(f"[ws] unexpected: {e}; retrying in {backoff}s")
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 60)
+                        _ingest(source, raw, merger)
+                    elif msg.type == WSMsgType.PING:
+                        try:
+                            await ws.pong()
+                        except Exception:
+                            pass
+                    elif msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED, WSMsgType.ERROR):
+                        break
+            delay = backoff.next()
+            _log("ws", f"{source} disconnected; reconnecting in {delay:.2f}s")
+        except asyncio.CancelledError:
+            raise
+        except _Stalled as e:
+            reason = "stall"
+            _METRICS.inc("gag_ws_stalls_total", source=source)
+            delay = backoff.next()
+            _log("ws", f"{source} stalled ({e}); reconnecting in {delay:.2f}s", level="warning")
+        except (ClientConnectorError, WSServerHandshakeError) as e:
+            reason = "connect"
+            delay = backoff.next()
+            _log("ws", f"{source} connect error: {e}; retrying in {delay:.2f}s", level="error")
+        except Exception as e:
+            reason = "error"
+            delay = backoff.next()
+            _log("ws", f"{source} unexpected: {e}; retrying in {delay:.2f}s", level="warning")
+        _METRICS.set("gag_ws_connected", 0, source=source)
+        _METRICS.inc("gag_ws_reconnects_total", source=source, reason=reason)
+        if lost_at is None:
+            lost_at = time.monotonic()
+        await _ws_backoff(delay, source)
+
+async def _http_poll_loop(session: ClientSession, source: str, url: str, headers: dict, merger: Optional[_UpstreamMerger] = None):
+    etag = None
+    backoff = _Backoff(base=HTTP_POLL_SEC, fast=HTTP_POLL_SEC)
+    while not bot.is_closed():
+        try:
+            h = dict(headers)
+            if etag:
+                h["If-None-Match"] = etag
+            async with session.get(url, headers=h) as resp:
+                _METRICS.inc("gag_ws_frames_received_total", type=f"http_{resp.status}")
+                if resp.status == 200:
+                    etag = resp.headers.get("ETag")
+                    raw = _json_loads(await resp.read())
+                    _METRICS.inc("gag_ws_frames_decoded_total")
+                    _ingest(source, raw, merger)
+                elif resp.status != 304:
+                    raise RuntimeError(f"HTTP {resp.status}")
+            backoff.reset()
+            await asyncio.sleep(HTTP_POLL_SEC)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = backoff.next()
+            _log("http", f"{source} poll error: {e}; retrying in {delay:.0f}s", level="error")
+            await _ws_backoff(delay, source)
+
+class _ShardHub:
+    def __init__(self, path: str):
+        self.path = path
+        self.writers: set = set()
+        self.latest: Dict[str, Any] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.stats: Dict[str, int] = {"sent": 0, "dropped": 0, "connects": 0}
+
+    async def start(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.server = await asyncio.start_unix_server(self._client, path=self.path)
+        _log("shard", f"ipc listening on {self.path}")
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connects"] += 1
+        if self.latest:
+            writer.write(json.dumps(self.latest, separators=(",", ":")).encode() + b"\n")
+        self.writers.add(writer)
+        try:
+            while await reader.read(1024):
+                pass
+        except Exception:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def broadcast(self, raw: dict):
+        self.latest.update(raw)
+        line = json.dumps(raw, separators=(",", ":")).encode() + b"\n"
+        for w in list(self.writers):
+            if w.transport.is_closing() or w.transport.get_write_buffer_size() > SHARD_IPC_MAX_BUFFER:
+                self.stats["dropped"] += 1
+                continue
+            w.write(line)
+            self.stats["sent"] += 1
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        for w in list(self.writers):
+            w.close()
+
+async def _shard_ipc_consumer():
+    parent = os.getppid()
+    dispatcher = asyncio.create_task(_frame_dispatcher(_dispatch_frame))
+    try:
+        while not bot.is_closed():
+            if os.getppid() != parent:
+                _log("shard", "ingest process is gone; exiting", level="warning")
+                await bot.close()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(SHARD_IPC_PATH, limit=64 * 1024 * 1024)
+            except OSError as e:
+                _log("shard", f"cannot reach ingest at {SHARD_IPC_PATH}: {e}; retrying in 1s", level="warning")
+                await asyncio.sleep(1)
+                continue
+            _log("shard", f"{SHARD_ID}/{SHARD_COUNT} connected to ingest")
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        raw = _json_loads(line)
+                    except ValueError:
+                        _METRICS.inc("gag_ws_frames_failed_total", reason="bad_ipc")
+                        continue
+                    _HEALTH["last_frame_at"] = time.time()
+                    if isinstance(raw, dict):
+                        cadence = raw.pop("_restock", None)
+                        if isinstance(cadence, dict):
+                            _PREDICT.adopt(cadence)
+                        _FRAME_BUF.put(raw)
+            finally:
+                writer.close()
+            _log("shard", "ingest connection closed; reconnecting")
+            await asyncio.sleep(0.5)
+    finally:
+        dispatcher.cancel()
+
+async def _run_shard_supervisor():
+    hub = _ShardHub(SHARD_IPC_PATH)
+    await hub.start()
+    _METRICS.collectors.append(lambda: (("gag_shard_ipc_total", {"event": k}, v) for k, v in hub.stats.items()))
+    try:
+        await bot.login(DISCORD_TOKEN)
+    except discord.LoginFailure as e:
+        _log("shard", f"DISCORD_TOKEN rejected: {e}; not starting senders", level="error")
+        hub.close()
+        return 1
+    except Exception as e:
+        _log("shard", f"cannot validate DISCORD_TOKEN: {e}; starting senders anyway", level="warning")
+    async def handler(raw: dict):
+        _record_ingest(raw)
+        await hub.broadcast(raw)
+
+    consumer = asyncio.create_task(ws_consumer(handler=handler))
+    procs: Dict[int, asyncio.subprocess.Process] = {}
+    backoff: Dict[int, float] = {}
+    started_at: Dict[int, float] = {}
+    retry_at: Dict[int, float] = {}
+    try:
+        while True:
+            now = time.monotonic()
+            for i in range(SHARD_COUNT):
+                p = procs.get(i)
+                if p is not None and p.returncode is None:
+                    if now - started_at[i] >= SHARD_HEALTHY_SEC:
+                        backoff[i] = SHARD_BACKOFF_SEC
+                    continue
+                if p is not None:
+                    if p.returncode == _EXIT_LOGIN_FAILED:
+                        _log("shard", f"sender {i} rejected DISCORD_TOKEN; stopping all senders", level="error")
+                        return 1
+                    delay = backoff.get(i, SHARD_BACKOFF_SEC)
+                    backoff[i] = min(delay * 2, 60)
+                    retry_at[i] = now + delay
+                    del procs[i]
+                    _log("shard", f"sender {i} exited with {p.returncode}; restarting in {delay:.0f}s", level="warning")
+                if now < retry_at.get(i, 0.0):
+                    continue
+                env = dict(os.environ, BOT_MODE="sender", SHARD_ID=str(i), SHARD_COUNT=str(SHARD_COUNT),
+                            SHARD_IPC_PATH=SHARD_IPC_PATH, STATE_DB_PATH=f"{STATE_DB_PATH}.shard{i}" if STATE_DB_PATH else "",
+                            HISTORY_DB_PATH="")
+                procs[i] = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), env=env)
+                started_at[i] = time.monotonic()
+                _log("shard", f"started sender {i}/{SHARD_COUNT} (pid {procs[i].pid})")
+            await asyncio.sleep(1)
+    finally:
+        consumer.cancel()
+        hub.close()
+        for p in procs.values():
+            if p.returncode is None:
+                p.terminate()
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    _role_index_add(role)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    if before.name != after.name:
+        _role_index_remove(before)
+    _role_index_add(after)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    _role_index_remove(role)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    _invalidate_guild_roles(guild.id)
 
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    _log("bot", f"logged in as {bot.user} (ID: {bot.user.id})")
     try:
         await tree.sync()
-        print("[slash] commands synced")
+        _log("slash", "commands synced")
     except Exception as e:
-        print(f"[slash] sync failed: {e}")
-    bot.loop.create_task(_send_worker())
-    bot.loop.create_task(ws_consumer())
+        _log("slash", f"sync failed: {e}", level="error")
+    bot.loop.create_task(_shard_ipc_consumer() if BOT_MODE == "sender" else ws_consumer())
 
 def shutdown(*_):
     if not bot.is_closed():
@@ -922,44 +3175,151 @@ def make_app():
     async def root(_):
         return web.Response(text="ok")
     async def health(_):
+        if not _HEALTH["active"]:
+            return web.Response(text="standby")
+        age = time.time() - (_HEALTH["last_frame_at"] or _HEALTH["started_at"])
+        if HEALTH_STALE_SEC > 0 and age > HEALTH_STALE_SEC:
+            return web.Response(status=503, text=f"stale: no frame for {int(age)}s")
         return web.Response(text="ok")
+    async def metrics(_):
+        return web.Response(text=_METRICS.render(), content_type="text/plain", charset="utf-8")
+    async def payload(request):
+        fmt = request.query.get("format", "compact")
+        if fmt not in PAYLOAD_FORMATS:
+            return web.Response(status=400, text=f"format must be one of {', '.join(PAYLOAD_FORMATS)}")
+        if _snapshot_empty():
+            return web.Response(status=404, text="no snapshot captured yet")
+        encoded = fmt == "gzip"
+        if fmt == "compact" and "gzip" in request.headers.get("Accept-Encoding", ""):
+            fmt, encoded = "gzip", True
+        data, etag = await _PAYLOAD_EXPORT.get(fmt)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers=headers)
+        if encoded:
+            headers["Content-Encoding"] = "gzip"
+        resp = web.StreamResponse(headers=headers)
+        resp.content_type = "application/json"
+        resp.content_length = len(data)
+        await resp.prepare(request)
+        view = memoryview(data)
+        for i in range(0, len(view), 65536):
+            await resp.write(view[i:i + 65536])
+        await resp.write_eof()
+        return resp
     app.router.add_get("/", root)
     app.router.add_get("/healthz", health)
+    app.router.add_get("/metrics", metrics)
+    async def history(request):
+        name = request.query.get("item", "").strip()
+        if not name:
+            return web.Response(status=400, text="item is required")
+        try:
+            recent = min(500, max(0, int(request.query.get("recent", "20"))))
+        except ValueError:
+            return web.Response(status=400, text="recent must be an integer")
+        h = _HISTORY.query(name, recent=recent)
+        if h is None:
+            return web.Response(status=404, text=f"no history for {name}")
+        return web.json_response(h)
+    app.router.add_get("/payload", payload)
+    async def predict(request):
+        name = request.query.get("item", "").strip()
+        if not name:
+            return web.Response(status=400, text="item is required")
+        pr = _PREDICT.predict(name)
+        if pr is None:
+            return web.Response(status=404, text=f"no prediction for {name}")
+        return web.json_response(pr)
+    app.router.add_get("/history", history)
+    app.router.add_get("/predict", predict)
     return app
 
-async def run_http_and_bot():
-    port = int(os.getenv("PORT", "10000"))
-    app = make_app()
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, host="0.0.0.0", port=port)
-    await site.start()
-    print(f"[http] listening on 0.0.0.0:{port}")
-    owns_lock = _acquire_singleton_lock()
-    if not owns_lock:
-        while True:
-            await asyncio.sleep(3600)
+async def _run_bot_forever():
     backoff = 5
     while True:
         try:
-            print("[bot] starting…")
+            _log("bot", "starting…")
             await bot.start(DISCORD_TOKEN)
         except Exception as e:
-            print(f"[bot] crashed: {e}; restarting in {backoff}s")
+            _log("bot", f"crashed: {e}; restarting in {backoff}s", level="error")
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 60)
         else:
-            print("[bot] exited; restarting in 5s")
+            _log("bot", "exited; restarting in 5s", level="warning")
             await asyncio.sleep(5)
             backoff = 5
 
+async def run_http_and_bot() -> int:
+    port = int(os.getenv("PORT", "10000"))
+    app = make_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host="0.0.0.0", port=port)
+    await site.start()
+    _log("http", f"listening on 0.0.0.0:{port}")
+    elector = _make_elector()
+    await elector.wait_leader()
+    _HEALTH["active"] = True
+    _HEALTH["started_at"] = time.time()
+    _restore_state()
+    _sweep_caches()
+    await _open_history()
+    flusher = asyncio.create_task(_state_flusher())
+    hflusher = asyncio.create_task(_history_flusher())
+    watcher = asyncio.create_task(_config_watcher())
+    keeper = asyncio.create_task(elector.keep())
+    work = asyncio.create_task(_run_shard_supervisor() if BOT_MODE == "sharded" else _run_bot_forever())
+    try:
+        done, _ = await asyncio.wait({keeper, work}, return_when=asyncio.FIRST_COMPLETED)
+        if keeper in done:
+            _log("lease", "leadership lost; stopping so a standby can take over", level="warning")
+            return 3
+        return work.result() or 0
+    finally:
+        work.cancel()
+        keeper.cancel()
+        flusher.cancel()
+        hflusher.cancel()
+        watcher.cancel()
+        if not bot.is_closed():
+            await bot.close()
+        _persist_snapshot(force=True)
+        _STATE.close()
+        _HISTORY.close()
+        elector.release()
+        await runner.cleanup()
+
+async def run_sender():
+    _HEALTH["active"] = True
+    _restore_state()
+    _sweep_caches()
+    await _open_history()
+    flusher = asyncio.create_task(_state_flusher())
+    hflusher = asyncio.create_task(_history_flusher())
+    watcher = asyncio.create_task(_config_watcher())
+    try:
+        await bot.start(DISCORD_TOKEN)
+    except discord.LoginFailure as e:
+        _log("bot", f"login failed: {e}", level="error")
+        return _EXIT_LOGIN_FAILED
+    finally:
+        flusher.cancel()
+        hflusher.cancel()
+        watcher.cancel()
+        _persist_snapshot(force=True)
+        _STATE.close()
+        _HISTORY.close()
+
 def main():
     if not DISCORD_TOKEN:
-        print("[error] DISCORD_TOKEN not set"); sys.exit(1)
+        _log("bot", "DISCORD_TOKEN not set", level="error"); sys.exit(1)
+    code = 0
     try:
-        asyncio.run(run_http_and_bot())
+        code = asyncio.run(run_sender() if BOT_MODE == "sender" else run_http_and_bot()) or 0
     except KeyboardInterrupt:
         pass
+    sys.exit(code)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()